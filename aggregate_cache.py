@@ -0,0 +1,125 @@
+import pandas as pd
+from profiling import profiled
+
+def _month_start(dates: pd.Series) -> pd.Series:
+    """
+    Maps every date to the first day of its month (NaT stays NaT).
+    """
+    return dates.dt.to_period('M').dt.to_timestamp()
+
+
+class AggregateCache:
+    """
+    Category and monthly totals computed once at load time and then kept up to date
+    with the deltas of every add, edit and delete, so the analysis options answer in
+    O(categories) instead of re-grouping the whole ledger.
+
+    Amounts are whole cents, so the running totals never drift from a recompute.
+    """
+
+    def __init__(self):
+        # Each store maps a key to [total in cents, number of rows]; the count lets a key
+        # disappear when its last row is deleted, exactly like a fresh groupby would
+        self.category = {}
+        self.expense_category = {}
+        self.month = {}
+
+    @classmethod
+    def from_transactions(cls, transactions: pd.DataFrame):
+        cache = cls()
+        cache.on_add(transactions)
+        return cache
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Folds the partial totals of each chunk together; only one chunk is held at a time.
+        """
+        cache = cls()
+        for chunk in chunks:
+            cache.on_add(chunk)
+        return cache
+
+    @staticmethod
+    def _apply(store: dict, keys: pd.Series, amounts: pd.Series, sign: int):
+        if keys.empty:
+            return
+        grouped = amounts.groupby(keys, observed=True).agg(['sum', 'count'])
+        for key, total, count in zip(grouped.index, grouped['sum'], grouped['count']):
+            entry = store.setdefault(key, [0, 0])
+            entry[0] += sign * int(total)
+            entry[1] += sign * int(count)
+            if entry[1] <= 0:
+                del store[key]
+
+    def _update(self, rows: pd.DataFrame, sign: int):
+        amounts = rows['Amount']
+        self._apply(self.category, rows['Category'], amounts, sign)
+        expenses = rows['Type'] == 'Expense'
+        self._apply(self.expense_category, rows.loc[expenses, 'Category'], amounts[expenses], sign)
+        self._apply(self.month, _month_start(pd.to_datetime(rows['Date'], errors='coerce')), amounts, sign)
+
+    def merge(self, other):
+        """
+        Adds the totals of another cache (e.g. computed for another file) to this one.
+        """
+        for name in ('category', 'expense_category', 'month'):
+            store = getattr(self, name)
+            for key, (total, count) in getattr(other, name).items():
+                entry = store.setdefault(key, [0, 0])
+                entry[0] += total
+                entry[1] += count
+        return self
+
+    def on_add(self, rows: pd.DataFrame):
+        self._update(rows, 1)
+
+    def on_delete(self, rows: pd.DataFrame):
+        self._update(rows, -1)
+
+    def on_edit(self, old_rows: pd.DataFrame, new_rows: pd.DataFrame):
+        self._update(old_rows, -1)
+        self._update(new_rows, 1)
+
+    @staticmethod
+    def _series(store: dict, name: str) -> pd.Series:
+        series = pd.Series({key: entry[0] for key, entry in store.items()}, dtype='int64', name='Amount')
+        series.index.name = name
+        return series
+
+    def category_totals(self) -> pd.Series:
+        """
+        Total amount in cents per category (all types), highest first.
+        """
+        return self._series(self.category, 'Category').sort_values(ascending=False)
+
+    def expense_totals(self) -> pd.Series:
+        """
+        Total expense in cents per category, ordered by category name.
+        """
+        return self._series(self.expense_category, 'Category').sort_index()
+
+    def monthly_totals(self) -> pd.DataFrame:
+        """
+        DataFrame with a row per month (same layout as data_analysis.monthly_spending, in cents).
+        """
+        monthly = self._series(self.month, 'Date').sort_index().reset_index()
+        return monthly[['Amount', 'Date']]
+
+    @profiled
+    def verify(self, transactions: pd.DataFrame) -> bool:
+        """
+        Compares every cached total against a full recompute of the ledger.
+
+        :param transactions: the pandas dataframe the cache should describe
+        :return: True when all the totals match
+        """
+        fresh = AggregateCache.from_transactions(transactions)
+        for name in ('category', 'expense_category', 'month'):
+            cached, expected = getattr(self, name), getattr(fresh, name)
+            if cached.keys() != expected.keys():
+                return False
+            for key, (total, count) in expected.items():
+                if cached[key] != [total, count]:
+                    return False
+        return True
@@ -0,0 +1,283 @@
+"""
+Benchmark harness. Generates synthetic ledgers (see synthetic.py), then times and
+memory-profiles the import, add/view/delete and the analysis and plotting functions.
+
+    python benchmarks/run.py --sizes 1000 100000 1000000 --output results.json
+    python benchmarks/run.py --sizes 1000 100000 --compare results.json
+
+Every benchmark is run --repeat times for wall and CPU time, then once more under
+tracemalloc for the peak of Python allocations. Results are written as JSON; with
+--compare the medians are checked against an earlier results file and the exit code
+is 1 when something got slower than --threshold.
+"""
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import matplotlib
+matplotlib.use('Agg')  # headless: the charts are rendered to memory, never shown
+
+import numpy as np
+import pandas as pd
+from synthetic import write_csv
+from aggregate_cache import AggregateCache
+from columnar_store import read_transactions
+from validation import load_validated
+from data_analysis import spending_by_category, monthly_spending
+from data_managment import add_transaction, view_transaction, delete_transaction
+from row_index import RowIndex
+import visualization
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+@contextlib.contextmanager
+def scripted_input(answers):
+    """
+    Answers the prompts of an interactive function.
+    """
+    answers = iter(answers)
+    original = builtins.input
+    builtins.input = lambda prompt='': next(answers)
+    try:
+        yield
+    finally:
+        builtins.input = original
+
+
+def _middle_dates(transactions, days=30):
+    # A range of `days` days in the middle of the ledger, as the user would type it
+    middle = transactions['Date'].iloc[len(transactions) // 2]
+    return middle.strftime('%Y-%m-%d'), (middle + pd.Timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+# Each benchmark receives the shared context and returns the call to time; anything
+# done before returning (copies, caches, inputs) is setup and is not measured.
+
+def bench_import(ctx):
+    # The loading done by choose_file once the dialog returns a CSV path
+    return lambda: load_validated(ctx['path'], report=False)
+
+
+def bench_add_transaction(ctx):
+    transactions = ctx['transactions'].copy()
+    listeners = [AggregateCache.from_transactions(transactions)]
+    date, _ = _middle_dates(transactions)
+    answers = [date, 'Food', 'Benchmark', '12.34', 'Expense']
+
+    def run():
+        with scripted_input(answers):
+            add_transaction(transactions, listeners)
+    return run
+
+
+def bench_view_transaction(ctx):
+    transactions = ctx['transactions']
+    start, end = _middle_dates(transactions)
+
+    def run():
+        with scripted_input([start, end, 'q']):
+            view_transaction(transactions)
+    return run
+
+
+def bench_delete_transaction(ctx):
+    transactions = ctx['transactions'].copy()
+    listeners = [AggregateCache.from_transactions(transactions)]
+    row_index = RowIndex()
+    transaction_id = str(transactions.index[len(transactions) // 2])
+
+    def run():
+        with scripted_input(['q', transaction_id, 'Y', 'N']):
+            delete_transaction(transactions, listeners, row_index)
+    return run
+
+
+def bench_spending_by_category(ctx):
+    return lambda: spending_by_category(ctx['transactions'])
+
+
+def bench_spending_by_category_cached(ctx):
+    return lambda: spending_by_category(ctx['transactions'], ctx['cache'])
+
+
+def bench_monthly_spending(ctx):
+    return lambda: monthly_spending(ctx['transactions'])
+
+
+def bench_monthly_spending_cached(ctx):
+    return lambda: monthly_spending(ctx['transactions'], ctx['cache'])
+
+
+def bench_monthly_spending_trend(ctx):
+    monthly = monthly_spending(ctx['transactions'], ctx['cache'])
+    return lambda: visualization.monthly_spending_trend(monthly, output=io.BytesIO())
+
+
+def bench_spending_by_categories(ctx):
+    return lambda: visualization.spending_by_categories(ctx['transactions'], output=io.BytesIO())
+
+
+def bench_spending_distribution(ctx):
+    return lambda: visualization.spending_distribution(ctx['transactions'], output=io.BytesIO())
+
+
+BENCHMARKS = {
+    'import': bench_import,
+    'add_transaction': bench_add_transaction,
+    'view_transaction': bench_view_transaction,
+    'delete_transaction': bench_delete_transaction,
+    'spending_by_category': bench_spending_by_category,
+    'spending_by_category[cache]': bench_spending_by_category_cached,
+    'monthly_spending': bench_monthly_spending,
+    'monthly_spending[cache]': bench_monthly_spending_cached,
+    'monthly_spending_trend': bench_monthly_spending_trend,
+    'spending_by_categories': bench_spending_by_categories,
+    'spending_distribution': bench_spending_distribution,
+}
+
+
+def measure(setup, ctx, repeat):
+    """
+    Times `repeat` fresh runs of one benchmark, then measures its peak allocations.
+
+    :return: dict with the wall/CPU times in seconds and the peak in bytes
+    """
+    wall, cpu = [], []
+    # The functions print their results; that output is discarded, its cost is not
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            run = setup(ctx)
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            run()
+            wall.append(time.perf_counter() - wall_start)
+            cpu.append(time.process_time() - cpu_start)
+
+        # tracemalloc slows allocations down, so memory gets a run of its own
+        run = setup(ctx)
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'wall_median_s': statistics.median(wall),
+        'wall_min_s': min(wall),
+        'cpu_median_s': statistics.median(cpu),
+        'peak_alloc_bytes': peak,
+        'repeat': repeat,
+    }
+
+
+def ledger_file(data_dir, rows, options) -> str:
+    """
+    Path of the synthetic ledger for these options, generated on first use.
+    """
+    name = 'ledger_{}_s{seed}_c{categories}_k{skew}_d{days}.csv'.format(rows, **options)
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path):
+        write_csv(path, rows, **options)
+    return path
+
+
+def metadata() -> dict:
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'revision': revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'matplotlib': matplotlib.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run_benchmarks(sizes, names, options, repeat, data_dir):
+    results = []
+    for rows in sizes:
+        path = ledger_file(data_dir, rows, options)
+        transactions = read_transactions(path, report=False)
+        ctx = {'path': path, 'transactions': transactions,
+               'cache': AggregateCache.from_transactions(transactions)}
+        for name in names:
+            result = {'benchmark': name, 'rows': rows, **measure(BENCHMARKS[name], ctx, repeat)}
+            results.append(result)
+            print(f"{name:<28} {rows:>12,} rows {result['wall_median_s']:>10.4f} s "
+                  f"{result['peak_alloc_bytes'] / 1024 ** 2:>10.2f} MB", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold) -> bool:
+    """
+    Prints the change of every median against a baseline results file.
+
+    :return: True when nothing is slower than `threshold` times the baseline
+    """
+    before = {(r['benchmark'], r['rows']): r['wall_median_s'] for r in baseline['results']}
+    ok = True
+    print(f"\nCompared with {baseline['meta'].get('revision')}:", file=sys.stderr)
+    for result in results:
+        key = (result['benchmark'], result['rows'])
+        if key not in before or before[key] == 0:
+            continue
+        ratio = result['wall_median_s'] / before[key]
+        flag = ''
+        if ratio > threshold:
+            flag, ok = '  SLOWER', False
+        print(f"{key[0]:<28} {key[1]:>12,} rows {ratio:>8.2f}x{flag}", file=sys.stderr)
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Personal Finance Tracker on synthetic ledgers.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="ledger sizes in rows")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help="benchmarks to run (all by default)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--categories', type=int, default=12, help="number of distinct categories")
+    parser.add_argument('--skew', type=float, default=1.0, help="Zipf exponent of the category frequencies")
+    parser.add_argument('--days', type=int, default=1460, help="days the dates are spread over")
+    parser.add_argument('--data-dir', default=None, help="keep the generated ledgers here for later runs")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=1.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    options = {'seed': args.seed, 'categories': args.categories, 'skew': args.skew, 'days': args.days}
+    with contextlib.ExitStack() as stack:
+        data_dir = args.data_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(data_dir, exist_ok=True)
+        results = run_benchmarks(args.sizes, args.only, options, args.repeat, data_dir)
+
+    with open(args.output, 'w') as handle:
+        json.dump({'meta': metadata(), 'ledger': options, 'results': results}, handle, indent=2)
+    print(f"Results saved to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            return 0 if compare(results, json.load(handle), args.threshold) else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Deterministic synthetic ledgers with the same five columns as transactions.csv.
+
+    python benchmarks/synthetic.py 1000000 ledger.csv --categories 40 --skew 1.2 --days 365
+
+The same arguments always produce the same file. Rows are generated and written in
+chunks, so ledgers of 10^8 rows never have to fit in memory.
+"""
+import argparse
+import itertools
+import string
+import numpy as np
+import pandas as pd
+
+# Realistic names first; more categories get synthetic (still alphabetic) names
+CATEGORY_NAMES = ['Food', 'Rent', 'Utilities', 'Transport', 'Income', 'Travel', 'Health', 'Shopping',
+                  'Education', 'Entertainment', 'Insurance', 'Taxes', 'Gifts', 'Pets', 'Subscriptions']
+DESCRIPTIONS = ['Grocery', 'Monthly rent', 'Electricity bill', 'Water bill', 'Taxi', 'Bus ticket', 'Dinner',
+                'Lunch', 'Breakfast', 'Salary', 'Freelance work', 'Investment return', 'Amazon order',
+                'Pharmacy', 'Flight', 'Hotel', 'Cinema', 'Gym membership', 'Internet', 'Phone bill']
+CHUNK_SIZE = 1_000_000
+
+
+def category_names(count: int) -> list:
+    """
+    Returns `count` distinct alphabetic category names.
+    """
+    names = CATEGORY_NAMES[:count]
+    suffixes = (''.join(letters) for size in itertools.count(1)
+                for letters in itertools.product(string.ascii_lowercase, repeat=size))
+    while len(names) < count:
+        names.append(f"Category{next(suffixes)}".capitalize())
+    return names
+
+
+def generate_chunks(rows: int, seed=0, categories=12, skew=1.0, start='2020-01-01', days=1460,
+                    income_share=0.1, chunk_size=CHUNK_SIZE):
+    """
+    Yields DataFrames with Date, Category, Description, Amount and Type columns.
+
+    :param rows: total number of transactions
+    :param seed: random seed; the same arguments always give the same ledger
+    :param categories: number of distinct categories (cardinality)
+    :param skew: Zipf exponent of the category frequencies (0 = uniform)
+    :param start: first possible date
+    :param days: number of days the dates are spread over
+    :param income_share: fraction of rows of type Income
+    :param chunk_size: rows per yielded DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(category_names(categories), dtype=object)
+    weights = 1.0 / np.arange(1, categories + 1) ** skew
+    weights /= weights.sum()
+    descriptions = np.array(DESCRIPTIONS, dtype=object)
+    first_day = np.datetime64(pd.Timestamp(start), 'D')
+
+    for offset in range(0, rows, chunk_size):
+        size = min(chunk_size, rows - offset)
+        kinds = np.where(rng.random(size) < income_share, 'Income', 'Expense').astype(object)
+        yield pd.DataFrame({
+            'Date': first_day + rng.integers(0, days, size),
+            'Category': names[rng.choice(categories, size, p=weights)],
+            'Description': descriptions[rng.integers(0, len(descriptions), size)],
+            'Amount': np.round(rng.lognormal(3.5, 1.2, size), 2) + 0.01,
+            'Type': kinds,
+        })
+
+
+def generate_ledger(rows: int, **options) -> pd.DataFrame:
+    """
+    Returns a whole synthetic ledger as one DataFrame (see generate_chunks for the options).
+    """
+    return pd.concat(generate_chunks(rows, **options), ignore_index=True)
+
+
+def write_csv(path, rows: int, **options):
+    """
+    Writes a synthetic ledger to a CSV file, one chunk at a time.
+    """
+    with open(path, 'w', newline='') as handle:
+        for number, chunk in enumerate(generate_chunks(rows, **options)):
+            chunk.to_csv(handle, index=False, header=number == 0, date_format='%Y-%m-%d')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic transactions CSV file.")
+    parser.add_argument('rows', type=int)
+    parser.add_argument('output')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--categories', type=int, default=12)
+    parser.add_argument('--skew', type=float, default=1.0)
+    parser.add_argument('--start', default='2020-01-01')
+    parser.add_argument('--days', type=int, default=1460)
+    args = parser.parse_args()
+    write_csv(args.output, args.rows, seed=args.seed, categories=args.categories, skew=args.skew,
+              start=args.start, days=args.days)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""
+Headless command-line interface, for cron jobs and pipelines.
+
+    python cli.py import statements/ --output ledger.ledger
+    python cli.py append ledger.ledger today.csv
+    python cli.py validate statement.csv --quarantine rejected.csv
+    python cli.py categories ledger.ledger --format csv
+    python cli.py monthly transactions.csv
+    python cli.py top transactions.csv -n 5
+    python cli.py export ledger.ledger --output transactions.csv
+    python cli.py plot monthly transactions.csv --output monthly.png
+    python cli.py range transactions.csv --start 2024-01-01 --end 2024-06-30 --category Food
+    python cli.py range ledger.ledger --start 2024-01-01 2024-04-01 --end 2024-03-31 2024-06-30
+    python cli.py rollup transactions.csv --period quarter
+    python cli.py import statements/ --output ledger.db
+    python cli.py view ledger.db --start 2024-03-01 --end 2024-03-31 --category Food
+
+Only pandas and the data modules are imported at startup; matplotlib is
+imported by the plot command alone and tkinter never is.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+
+def _database(path):
+    # An SQLite ledger answers the queries itself, through its indexes
+    from sqlite_store import SQLITE_SUFFIX, SqliteStore
+    return SqliteStore(path) if str(path).endswith(SQLITE_SUFFIX) else None
+
+
+def _totals(args):
+    store = _database(args.source)
+    if store is not None:
+        return store
+    # Streams the file, so the commands work on ledgers larger than memory
+    from data_analysis import aggregate_file
+    from data_loader import DEFAULT_CHUNK_SIZE
+    return aggregate_file(args.source, args.chunk_size or DEFAULT_CHUNK_SIZE)
+
+
+def _write(data, args):
+    """
+    Writes a pandas Series/DataFrame to stdout as JSON or CSV.
+    """
+    if args.format == 'csv':
+        data.to_csv(sys.stdout, index=False)
+    else:
+        json.dump(data.to_dict(orient='records'), sys.stdout, indent=2, default=str)
+        sys.stdout.write('\n')
+
+
+def _units(amounts):
+    # The stores sum whole cents; answers are given in currency units
+    from money import to_units
+    return to_units(amounts)
+
+
+def _category_rows(totals, limit=None):
+    rows = totals.head(limit) if limit is not None else totals
+    return _units(rows).rename_axis('Category').reset_index()
+
+
+def run_import(args):
+    from columnar_store import read_transactions, write_transactions
+    from multi_import import find_files, import_files
+
+    paths = [path for source in args.sources
+             for path in ([source] if os.path.isfile(source) else find_files(source))]
+    if len(paths) == 1:
+        transactions = read_transactions(paths[0], report=False)
+    else:
+        transactions, _ = import_files(paths, workers=args.workers, report=False)
+
+    write_transactions(transactions, args.output)
+    json.dump({'files': len(paths), 'rows': len(transactions), 'output': args.output}, sys.stdout)
+    sys.stdout.write('\n')
+
+
+def run_append(args):
+    # Daily imports: only rows the history does not have yet are added, checked
+    # against the fingerprints saved next to it instead of the history itself
+    from columnar_store import read_transactions, write_transactions
+    from data_managment import add_new_transactions
+    from fingerprints import FingerprintSet
+    from multi_import import find_files, import_files
+
+    paths = [path for source in args.sources
+             for path in ([source] if os.path.isfile(source) else find_files(source))]
+    if len(paths) == 1:
+        statements = read_transactions(paths[0], report=False)
+    else:
+        # Overlaps between the new statements themselves are removed here
+        statements, _ = import_files(paths, report=False)
+
+    store = _database(args.history)
+    if store is not None:
+        # Neither the history nor its fingerprints are read row by row: the set saved in
+        # the database is checked, and only the new rows are inserted
+        try:
+            fingerprint_set, version = store.load_fingerprints()
+            fresh = statements[fingerprint_set.unseen(statements)]
+            fresh = fresh.set_axis(range(store.next_id(), store.next_id() + len(fresh)))
+            if len(fresh):
+                store.on_add(fresh)
+                fingerprint_set.on_add(fresh)
+                version += 1
+            store.save_fingerprints(fingerprint_set, version)
+            added, skipped, rows = len(fresh), len(statements) - len(fresh), len(store)
+        finally:
+            store.close()
+    else:
+        history = read_transactions(args.history, report=False)
+        fingerprint_set = FingerprintSet.open(args.history, history)
+        # The progress messages would corrupt the JSON on stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            history, added, skipped = add_new_transactions(history, statements, fingerprint_set)
+        if added:
+            root, extension = os.path.splitext(args.history)
+            temp_path = f"{root}.tmp{extension}"
+            write_transactions(history, temp_path)
+            os.replace(temp_path, args.history)
+        fingerprint_set.save(args.history)
+        rows = len(history)
+    json.dump({'files': len(paths), 'added': added, 'duplicates': skipped, 'rows': rows}, sys.stdout)
+    sys.stdout.write('\n')
+
+
+def run_validate(args):
+    from data_loader import DEFAULT_CHUNK_SIZE
+    from validation import load_validated, quarantine
+    _, errors, rejected = load_validated(args.source, args.chunk_size or DEFAULT_CHUNK_SIZE, report=False)
+    if args.quarantine and not rejected.empty:
+        quarantine(rejected, args.quarantine)
+    _write(errors, args)
+
+
+def run_categories(args):
+    _write(_category_rows(_totals(args).category_totals()), args)
+
+
+def run_top(args):
+    _write(_category_rows(_totals(args).category_totals(), args.n), args)
+
+
+def run_monthly(args):
+    import pandas as pd
+    monthly = _totals(args).monthly_totals()
+    monthly['Date'] = pd.to_datetime(monthly['Date']).dt.strftime('%Y-%m')
+    monthly['Amount'] = _units(monthly['Amount'])
+    _write(monthly[['Date', 'Amount']], args)
+
+
+def run_export(args):
+    from columnar_store import read_transactions, write_transactions
+    transactions = read_transactions(args.source, report=False)
+    write_transactions(transactions, args.output)
+    json.dump({'rows': len(transactions), 'output': args.output}, sys.stdout)
+    sys.stdout.write('\n')
+
+
+def _cube(args):
+    store = _database(args.source)
+    if store is not None:
+        # Same questions, answered by SQL on the indexed database without a build
+        return store
+    # Day x category x type cube; every question after the build is O(1)
+    from columnar_store import iter_chunks
+    from data_loader import DEFAULT_CHUNK_SIZE
+    from spending_cube import SpendingCube
+    return SpendingCube.from_chunks(iter_chunks(args.source, args.chunk_size or DEFAULT_CHUNK_SIZE,
+                                                ['Date', 'Category', 'Amount', 'Type']))
+
+
+def _kind(args):
+    return None if args.type == 'All' else args.type
+
+
+def run_range(args):
+    # The cube is built once per run and answers every window from it, one JSON line each
+    if len(args.start) != len(args.end):
+        raise ValueError("Give as many --end dates as --start dates.")
+    cube = _cube(args)
+    for start, end in zip(args.start, args.end):
+        json.dump({'start': start, 'end': end, 'category': args.category, 'type': args.type,
+                   'Amount': _units(cube.total(start, end, args.category, _kind(args)))}, sys.stdout)
+        sys.stdout.write('\n')
+
+
+def run_rollup(args):
+    rollup = _units(_cube(args).rollup(args.period, args.category, _kind(args), args.start, args.end)).reset_index()
+    rollup['Date'] = rollup['Date'].dt.strftime('%Y-%m-%d')
+    _write(rollup, args)
+
+
+def run_view(args):
+    # The rows of a date range, like view_transaction; a database reads only those rows
+    import pandas as pd
+    store = _database(args.source)
+    if store is not None:
+        rows = store.transactions_between(args.start, args.end, args.category, _kind(args))
+    else:
+        from columnar_store import iter_chunks
+        from data_loader import DEFAULT_CHUNK_SIZE, concat_transactions
+        start, end = pd.Timestamp(args.start), pd.Timestamp(args.end)
+        frames = []
+        for chunk in iter_chunks(args.source, args.chunk_size or DEFAULT_CHUNK_SIZE):
+            mask = chunk['Date'].between(start, end)
+            if args.category is not None:
+                mask &= chunk['Category'] == args.category
+            if _kind(args) is not None:
+                mask &= chunk['Type'] == _kind(args)
+            frames.append(chunk[mask])
+        # Files are not always in date order; the database returns its rows sorted
+        rows = concat_transactions(frames).sort_values('Date', kind='stable', ignore_index=True)
+    rows['Amount'] = _units(rows['Amount'])
+    rows['Date'] = rows['Date'].dt.strftime('%Y-%m-%d')
+    _write(rows, args)
+
+
+def run_plot(args):
+    # Plotting is the only command that needs matplotlib; render without a display
+    import matplotlib
+    matplotlib.use('Agg')
+    import visualization
+    from columnar_store import read_transactions
+
+    cache = _totals(args)
+    if args.chart == 'monthly':
+        monthly = cache.monthly_totals()
+        monthly['Amount'] = _units(monthly['Amount'])
+        visualization.monthly_spending_trend(monthly, output=args.output)
+    else:
+        transactions = read_transactions(args.source, report=False)
+        chart = visualization.spending_by_categories if args.chart == 'categories' else visualization.spending_distribution
+        chart(transactions, cache, output=args.output)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='cli.py', description="Personal Finance Tracker, non-interactive mode.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_source(command):
+        command.add_argument('source', help="CSV, .ledger or .db file")
+        command.add_argument('--chunk-size', type=int, default=None,
+                             help="rows held in memory at once (1,000,000 by default)")
+
+    def add_format(command):
+        command.add_argument('--format', choices=('json', 'csv'), default='json')
+
+    command = commands.add_parser('import', help="combine statement files into one ledger")
+    command.add_argument('sources', nargs='+', help="files, directories or glob patterns")
+    command.add_argument('--output', required=True, help="destination .csv, .ledger or .db file")
+    command.add_argument('--workers', type=int, default=None, help="number of processes")
+    command.set_defaults(run=run_import)
+
+    command = commands.add_parser('append', help="add statement files to a ledger, skipping rows it already has")
+    command.add_argument('history', help="the ledger (.csv, .ledger or .db), updated in place")
+    command.add_argument('sources', nargs='+', help="files, directories or glob patterns")
+    command.set_defaults(run=run_append)
+
+    command = commands.add_parser('validate', help="list the rows of a CSV file that break the transaction rules")
+    add_source(command)
+    add_format(command)
+    command.add_argument('--quarantine', default=None, help="also write the rejected rows to this CSV file")
+    command.set_defaults(run=run_validate)
+
+    command = commands.add_parser('categories', help="total amount per category")
+    add_source(command)
+    add_format(command)
+    command.set_defaults(run=run_categories)
+
+    command = commands.add_parser('monthly', help="total amount per month")
+    add_source(command)
+    add_format(command)
+    command.set_defaults(run=run_monthly)
+
+    command = commands.add_parser('top', help="top N categories")
+    add_source(command)
+    add_format(command)
+    command.add_argument('-n', type=int, default=5)
+    command.set_defaults(run=run_top)
+
+    command = commands.add_parser('export', help="convert between CSV, .ledger and .db")
+    command.add_argument('source', help="CSV, .ledger or .db file")
+    command.add_argument('--output', required=True, help="destination .csv, .ledger or .db file")
+    command.set_defaults(run=run_export)
+
+    def add_filters(command, kind='Expense'):
+        command.add_argument('--category', default=None, help="one category (all by default)")
+        command.add_argument('--type', choices=('Expense', 'Income', 'All'), default=kind)
+
+    command = commands.add_parser('range', help="total for one or more date ranges")
+    add_source(command)
+    command.add_argument('--start', required=True, nargs='+', help="first day of each range (YYYY-MM-DD)")
+    command.add_argument('--end', required=True, nargs='+', help="last day of each range (YYYY-MM-DD)")
+    add_filters(command)
+    command.set_defaults(run=run_range)
+
+    command = commands.add_parser('rollup', help="totals per month, quarter or year")
+    add_source(command)
+    add_format(command)
+    add_filters(command)
+    command.add_argument('--period', choices=('month', 'quarter', 'year'), default='month')
+    command.add_argument('--start', default=None, help="first day (YYYY-MM-DD)")
+    command.add_argument('--end', default=None, help="last day (YYYY-MM-DD)")
+    command.set_defaults(run=run_rollup)
+
+    command = commands.add_parser('view', help="transactions of a date range")
+    add_source(command)
+    add_format(command)
+    command.add_argument('--start', required=True, help="first day (YYYY-MM-DD)")
+    command.add_argument('--end', required=True, help="last day (YYYY-MM-DD)")
+    add_filters(command, 'All')
+    command.set_defaults(run=run_view)
+
+    command = commands.add_parser('plot', help="render a chart to an image file")
+    command.add_argument('chart', choices=('monthly', 'categories', 'distribution'))
+    add_source(command)
+    command.add_argument('--output', required=True, help="destination image (e.g. chart.png)")
+    command.set_defaults(run=run_plot)
+
+    return parser
+
+
+def main(argv=None):
+    from profiling import start_from_env
+    start_from_env()
+    args = build_parser().parse_args(argv)
+    try:
+        args.run(args)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+import json
+import struct
+import numpy as np
+import pandas as pd
+from data_loader import (TRANSACTION_COLUMNS, TRANSACTION_DTYPES, DEFAULT_CHUNK_SIZE, load_transactions,
+                         empty_transactions, iter_transaction_chunks)
+from profiling import profiled
+from money import to_cents, to_units
+from sqlite_store import SQLITE_SUFFIX, read_database, write_database, iter_database_chunks
+
+# Binary columnar ledger file:
+#   8 bytes magic | 8 bytes header length (little endian) | JSON header | column arrays
+# Every column is one fixed-width array aligned to 64 bytes. Text columns are
+# dictionary encoded: the array holds integer codes and the header the distinct values.
+# Amount is int64 cents (files written before that hold float64 units, converted on read).
+# The transaction IDs (the dataframe index) are one more int64 array, described by the
+# 'index' entry of the header; files written before that are numbered 0..n-1 on read.
+LEDGER_SUFFIX = '.ledger'
+MAGIC = b'PFTLEDG1'
+ALIGNMENT = 64
+
+
+def _codes_dtype(size: int):
+    # Smallest signed integer able to hold every code plus -1 for missing values
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _encode(series: pd.Series):
+    """
+    Returns (array, dictionary) for a column; dictionary is None for numeric columns.
+    """
+    if series.name == 'Date':
+        return pd.to_datetime(series).to_numpy(dtype='datetime64[ns]').view('<i8'), None
+    if series.name == 'Amount':
+        return series.to_numpy(dtype='<i8'), None
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, dictionary = series.cat.codes.to_numpy(), list(series.cat.categories)
+    else:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        dictionary = list(uniques)
+    return codes.astype(_codes_dtype(len(dictionary))), dictionary
+
+
+def write_ledger(transactions: pd.DataFrame, path):
+    """
+    Writes the transactions in the binary columnar format.
+
+    :param transactions: pandas dataframe with the transaction columns
+    :param path: destination file, conventionally ending in .ledger
+    """
+    arrays, columns = [], {}
+    offset = 0
+    for column in TRANSACTION_COLUMNS:
+        array, dictionary = _encode(transactions[column])
+        offset += -offset % ALIGNMENT
+        columns[column] = {'dtype': array.dtype.str, 'offset': offset}
+        if dictionary is not None:
+            columns[column]['dictionary'] = [str(value) for value in dictionary]
+        arrays.append((offset, array))
+        offset += array.nbytes
+    offset += -offset % ALIGNMENT
+    index = {'dtype': '<i8', 'offset': offset}
+    arrays.append((offset, transactions.index.to_numpy(dtype='<i8')))
+    offset += len(transactions) * 8
+
+    header = json.dumps({'rows': len(transactions), 'columns': columns, 'index': index}).encode('utf-8')
+    # Array offsets are relative to the first aligned byte after the header
+    data_start = len(MAGIC) + 8 + len(header)
+    data_start += -data_start % ALIGNMENT
+
+    with open(path, 'wb') as handle:
+        handle.write(MAGIC)
+        handle.write(struct.pack('<Q', len(header)))
+        handle.write(header)
+        for array_offset, array in arrays:
+            handle.seek(data_start + array_offset)
+            handle.write(array.tobytes())
+        handle.truncate(data_start + offset)
+
+
+def _read_header(path):
+    """
+    Returns (header, position of the first column array) of a ledger file.
+    """
+    with open(path, 'rb') as handle:
+        if handle.read(len(MAGIC)) != MAGIC:
+            raise ValueError("The file is not a ledger file.")
+        header_size = struct.unpack('<Q', handle.read(8))[0]
+        header = json.loads(handle.read(header_size))
+    data_start = len(MAGIC) + 8 + header_size
+    return header, data_start + -data_start % ALIGNMENT
+
+
+def _decode(column, spec, array):
+    """
+    Turns a stored array back into the values of a dataframe column.
+    """
+    if column == 'Date':
+        return array.view('datetime64[ns]')
+    if column == 'Amount' and array.dtype.kind == 'f':
+        # Written before amounts were stored in cents
+        return to_cents(array)
+    if 'dictionary' not in spec:
+        return array
+    if TRANSACTION_DTYPES.get(column) == 'category':
+        return pd.Categorical.from_codes(array, categories=spec['dictionary'])
+    # Plain text column: decode every code at once, -1 becomes NaN
+    values = np.array(spec['dictionary'] + [np.nan], dtype=object)
+    return values[array]
+
+
+def _mapped_columns(path, columns):
+    """
+    Memory maps a ledger file and returns (rows, header specs, {column: raw array}, IDs).
+    The IDs are a RangeIndex for files written without them.
+    """
+    header, data_start = _read_header(path)
+    rows = header['rows']
+    if rows == 0:
+        return 0, header['columns'], {}, pd.RangeIndex(0)
+    mapped = np.memmap(path, dtype=np.uint8, mode='c')
+
+    def array(spec):
+        dtype = np.dtype(spec['dtype'])
+        start = data_start + spec['offset']
+        return mapped[start:start + rows * dtype.itemsize].view(dtype)
+
+    arrays = {column: array(header['columns'][column]) for column in columns}
+    ids = array(header['index']) if 'index' in header else pd.RangeIndex(rows)
+    return rows, header['columns'], arrays, ids
+
+
+def read_ledger(path) -> pd.DataFrame:
+    """
+    Opens a ledger file through a memory map. Numeric columns are used straight
+    from the mapped pages, so only what is touched is read from disk and several
+    processes opening the same file share those pages. The map is copy-on-write:
+    editing the returned dataframe never changes the file.
+
+    :param path: a file written by write_ledger
+    :return: pandas dataframe with the same schema as load_transactions, indexed by the saved IDs
+    """
+    rows, specs, arrays, ids = _mapped_columns(path, TRANSACTION_COLUMNS)
+    if rows == 0:
+        return empty_transactions()
+    data = {column: _decode(column, specs[column], array) for column, array in arrays.items()}
+    return pd.DataFrame(data, index=pd.Index(ids), columns=TRANSACTION_COLUMNS, copy=False)
+
+
+def iter_ledger_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+    """
+    Streams a ledger file in chunks of at most chunk_size rows, decoding only
+    the requested columns of the current chunk.
+    """
+    columns = TRANSACTION_COLUMNS if columns is None else [c for c in TRANSACTION_COLUMNS if c in columns]
+    rows, specs, arrays, ids = _mapped_columns(path, columns)
+    for start in range(0, rows, chunk_size):
+        data = {column: _decode(column, specs[column], array[start:start + chunk_size])
+                for column, array in arrays.items()}
+        yield pd.DataFrame(data, index=pd.Index(ids[start:start + chunk_size]), columns=columns, copy=False)
+
+
+def csv_to_ledger(csv_path, ledger_path):
+    """
+    Converts a transactions CSV file into a ledger file.
+    """
+    write_ledger(load_transactions(csv_path, report=False), ledger_path)
+
+
+def ledger_to_csv(ledger_path, csv_path):
+    """
+    Converts a ledger file back into a transactions CSV file.
+    """
+    write_transactions(read_ledger(ledger_path), csv_path)
+
+
+def iter_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+    """
+    Streams a ledger, database or CSV file in bounded-size chunks, depending on its extension.
+    """
+    if str(path).endswith(LEDGER_SUFFIX):
+        return iter_ledger_chunks(path, chunk_size, columns)
+    if str(path).endswith(SQLITE_SUFFIX):
+        return iter_database_chunks(path, chunk_size, columns)
+    return iter_transaction_chunks(path, chunk_size, columns)
+
+
+@profiled
+def read_transactions(path, report=True) -> pd.DataFrame:
+    """
+    Loads a ledger, database or CSV file, depending on its extension.
+    """
+    if str(path).endswith(LEDGER_SUFFIX):
+        return read_ledger(path)
+    if str(path).endswith(SQLITE_SUFFIX):
+        return read_database(path)
+    return load_transactions(path, report=report)
+
+
+@profiled
+def write_transactions(transactions: pd.DataFrame, path):
+    """
+    Saves the transactions as a ledger, database or CSV file, depending on the extension.
+    """
+    if str(path).endswith(LEDGER_SUFFIX):
+        write_ledger(transactions, path)
+    elif str(path).endswith(SQLITE_SUFFIX):
+        write_database(transactions, path)
+    else:
+        # Amounts go back to currency units; two decimals print the cents exactly
+        transactions.assign(Amount=to_units(transactions['Amount'])).to_csv(
+            path, index=False, date_format='%Y-%m-%d', float_format='%.2f')
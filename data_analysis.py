@@ -1,34 +1,59 @@
 import pandas as pd
-
-def spending_by_category(transactions):
+from datetime import datetime
+from aggregate_cache import AggregateCache
+from columnar_store import iter_chunks
+from data_loader import DEFAULT_CHUNK_SIZE
+from profiling import profiled
+from money import to_units, format_amount
+from spending_cube import ROLLUPS
+
+# Columns needed by the streaming analysis; Description is never read
+STREAMING_COLUMNS = ['Date', 'Category', 'Amount', 'Type']
+
+@profiled
+def spending_by_category(transactions, cache=None):
     """
     Function to check the spending by each category
 
     :param transactions: original pandas dataframe
-    :return: total by category
+    :param cache: optional AggregateCache (or SqliteStore, grouping in SQL), used instead of grouping the whole dataframe
+    :return: total by category, in currency units
     """
     # Breaking the function if the value is nothing
     if transactions.empty:
         print("No transactions available.")
         return
 
-    total_by_category = transactions.groupby('Category')['Amount'].sum()
-    total_by_category = total_by_category.sort_values(ascending=False)
+    if cache is not None:
+        total_by_category = cache.category_totals()
+    else:
+        total_by_category = transactions.groupby('Category', observed=True)['Amount'].sum()
+        total_by_category = total_by_category.sort_values(ascending=False)
     print("\nTotal spent by category:\n")
     # returning it because the function that returns the Top 10 categories need it
-    return total_by_category
+    # The sums are exact integers of cents; only the result is converted to units
+    return to_units(total_by_category)
 
 
-def monthly_spending(transactions: pd.DataFrame) -> pd.DataFrame:
+@profiled
+def monthly_spending(transactions: pd.DataFrame, cache=None) -> pd.DataFrame:
     """
     Groups transactions by Year-Month and returns a DataFrame
     with columns ['Date', 'Amount'] where Amount is the total monthly spending.
     This function does not modify the original transactions DataFrame.
+    When an AggregateCache is given the totals come straight from it; a SqliteStore
+    computes them with a GROUP BY inside the database.
     """
     if transactions.empty:
         print("No transactions available.")
         return pd.DataFrame()
 
+    if cache is not None:
+        monthly_totals = cache.monthly_totals()
+        monthly_totals['Amount'] = to_units(monthly_totals['Amount'])
+        print("\nMonthly spending (aggregated):\n", monthly_totals)
+        return monthly_totals
+
     # Work on a copy so the original DataFrame remains unmodified
     df = transactions.copy()
 
@@ -50,10 +75,14 @@ def monthly_spending(transactions: pd.DataFrame) -> pd.DataFrame:
     # Sort by date ascending
     monthly_totals.sort_values(by='Date', inplace=True)
 
+    # Summed in cents, shown in currency units
+    monthly_totals['Amount'] = to_units(monthly_totals['Amount'])
+
     print("\nMonthly spending (aggregated):\n", monthly_totals)
     return monthly_totals
 
 
+@profiled
 def top_5_spending_categories(transactions_by_category):
     """
     Prints the top 5 categories from a Series of total spending by category.
@@ -65,3 +94,109 @@ def top_5_spending_categories(transactions_by_category):
 
     print("\nTop 5 Spending Categories:\n")
     print(transactions_by_category.head())
+
+
+
+def _cube_filters():
+    # Category and type asked by spending_totals; None stands for all of them
+    category = input("Category (blank for all): ").strip() or None
+    kind = input("Type (Expense/Income/All, default Expense): ").strip().capitalize() or "Expense"
+    if kind not in ("Expense", "Income", "All"):
+        raise ValueError("Type must be 'Expense', 'Income' or 'All'.")
+    return category, None if kind == "All" else kind
+
+
+def spending_totals(cube):
+    """
+    Menu option: totals for as many date ranges as wanted, and per month, quarter or
+    year. Every answer is read from the SpendingCube the menu keeps up to date, so
+    after the first build each question costs O(1) instead of a scan of the ledger.
+
+    :param cube: SpendingCube registered as a listener of the ledger
+    """
+    while True:
+        action = input("\n[R] total for a date range, [P] totals per month, quarter or year, [Enter] back: ")
+        action = action.strip().capitalize()
+        if action == "R":
+            try:
+                start = pd.Timestamp(datetime.strptime(input("Start date (YYYY-MM-DD): ").strip(), "%Y-%m-%d"))
+                end = pd.Timestamp(datetime.strptime(input("End date (YYYY-MM-DD): ").strip(), "%Y-%m-%d"))
+            except ValueError:
+                print("\nInvalid date format. Please use YYYY-MM-DD.")
+                continue
+            try:
+                category, kind = _cube_filters()
+            except ValueError as e:
+                print(f"\n{e}")
+                continue
+            total = cube.total(start, end, category, kind)
+            print(f"\nTotal from {start:%Y-%m-%d} to {end:%Y-%m-%d}: {format_amount(total)}")
+        elif action == "P":
+            period = input("Period (month/quarter/year, default month): ").strip().lower() or "month"
+            try:
+                if period not in ROLLUPS:
+                    raise ValueError("Period must be 'month', 'quarter' or 'year'.")
+                category, kind = _cube_filters()
+            except ValueError as e:
+                print(f"\n{e}")
+                continue
+            print(f"\nTotals per {period}:\n")
+            totals = to_units(cube.rollup(period, category, kind))
+            totals.index = totals.index.strftime('%Y-%m-%d')
+            print(totals.to_string())
+        else:
+            return
+
+
+@profiled
+def aggregate_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE) -> AggregateCache:
+    """
+    Reads a CSV or ledger file in bounded-size chunks and folds the totals of each
+    chunk together, so peak memory depends on chunk_size and not on the file size.
+
+    :param file_path: path of the transactions file
+    :param chunk_size: number of rows held in memory at once
+    :return: AggregateCache with the totals of the whole file
+    """
+    return AggregateCache.from_chunks(iter_chunks(file_path, chunk_size, STREAMING_COLUMNS))
+
+
+def spending_by_category_streaming(file_path, chunk_size=DEFAULT_CHUNK_SIZE, cache=None):
+    """
+    Out-of-core version of spending_by_category, for files larger than memory.
+
+    :param file_path: path of the transactions file
+    :param chunk_size: number of rows held in memory at once
+    :param cache: totals already computed by aggregate_file (the file is not read again)
+    :return: total by category
+    """
+    cache = aggregate_file(file_path, chunk_size) if cache is None else cache
+    if not cache.category:
+        print("No transactions available.")
+        return
+
+    total_by_category = to_units(cache.category_totals())
+    print("\nTotal spent by category:\n")
+    return total_by_category
+
+
+def monthly_spending_streaming(file_path, chunk_size=DEFAULT_CHUNK_SIZE, cache=None) -> pd.DataFrame:
+    """
+    Out-of-core version of monthly_spending, for files larger than memory.
+    """
+    cache = aggregate_file(file_path, chunk_size) if cache is None else cache
+    if not cache.category:
+        print("No transactions available.")
+        return pd.DataFrame()
+
+    monthly_totals = cache.monthly_totals()
+    monthly_totals['Amount'] = to_units(monthly_totals['Amount'])
+    print("\nMonthly spending (aggregated):\n", monthly_totals)
+    return monthly_totals
+
+
+def top_5_spending_categories_streaming(file_path, chunk_size=DEFAULT_CHUNK_SIZE, cache=None):
+    """
+    Out-of-core version of top_5_spending_categories, for files larger than memory.
+    """
+    top_5_spending_categories(spending_by_category_streaming(file_path, chunk_size, cache))
@@ -0,0 +1,156 @@
+import os
+import time
+import pandas as pd
+from pandas.api.types import union_categoricals
+from profiling import profiled, profiler
+from money import to_cents
+
+# Required fields for the CSV file
+required_fields = {'Date', 'Category', 'Description', 'Amount', 'Type'}
+
+# Column order used everywhere in the application
+TRANSACTION_COLUMNS = ['Date', 'Category', 'Description', 'Amount', 'Type']
+
+# Explicit schema, so pandas never has to guess the type of a column.
+# Amount holds whole cents (see money.py); files store it in currency units.
+TRANSACTION_DTYPES = {
+    'Category': 'category',
+    'Description': 'object',
+    'Amount': 'int64',
+    'Type': 'category',
+}
+# How the columns are parsed from CSV text, before Amount is converted to cents
+CSV_DTYPES = {**TRANSACTION_DTYPES, 'Amount': 'float64'}
+CATEGORICAL_COLUMNS = ['Category', 'Type']
+
+# Number of rows parsed at once; bounds the temporary memory used by the parser
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+
+def empty_transactions() -> pd.DataFrame:
+    """
+    Returns an empty DataFrame that already follows the transaction schema.
+    """
+    df = pd.DataFrame({column: pd.Series(dtype=TRANSACTION_DTYPES.get(column, 'object'))
+                       for column in TRANSACTION_COLUMNS})
+    df['Date'] = pd.Series(dtype='datetime64[ns]')
+    return df
+
+
+def read_header(file_path) -> list:
+    """
+    Reads only the first line of a CSV file and returns its column names.
+    """
+    return list(pd.read_csv(file_path, nrows=0).columns)
+
+
+def iter_transaction_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE, columns=None, progress=None):
+    """
+    Streams a transactions CSV file in chunks that already follow the schema.
+
+    :param file_path: path of the CSV file
+    :param chunk_size: number of rows per chunk
+    :param columns: subset of TRANSACTION_COLUMNS to read (all of them by default)
+    :param progress: optional dict updated with 'rows' and 'bytes' after each chunk
+    :return: generator of typed pandas DataFrames
+    """
+    columns = TRANSACTION_COLUMNS if columns is None else [c for c in TRANSACTION_COLUMNS if c in columns]
+    dtypes = {column: dtype for column, dtype in CSV_DTYPES.items() if column in columns}
+
+    with open(file_path, 'rb') as handle:
+        reader = pd.read_csv(handle, usecols=columns, dtype=dtypes, chunksize=chunk_size, engine='c')
+        for chunk in reader:
+            if 'Date' in chunk.columns:
+                chunk['Date'] = pd.to_datetime(chunk['Date'], format='ISO8601')
+            if 'Amount' in chunk.columns:
+                chunk['Amount'] = to_cents(chunk['Amount'])
+            if progress is not None:
+                progress['rows'] = progress.get('rows', 0) + len(chunk)
+                progress['bytes'] = handle.tell()
+            yield chunk[columns]
+
+
+def concat_transactions(frames, ignore_index=True) -> pd.DataFrame:
+    """
+    Concatenates typed transaction frames without losing the categorical columns.
+    pd.concat falls back to object dtype when the categories differ, so those
+    columns are merged separately with union_categoricals.
+
+    :param frames: transaction dataframes
+    :param ignore_index: number the rows 0..n-1 instead of keeping their IDs
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return empty_transactions()
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True) if ignore_index else frames[0]
+
+    categorical = [c for c in CATEGORICAL_COLUMNS if c in frames[0].columns]
+    merged = {column: union_categoricals([frame[column].astype('category') for frame in frames],
+                                         sort_categories=True)
+              for column in categorical}
+    df = pd.concat([frame.drop(columns=categorical) for frame in frames], ignore_index=ignore_index)
+    for column, values in merged.items():
+        df[column] = values
+    return df[list(frames[0].columns)]
+
+
+def peak_resident_memory():
+    """
+    Returns the peak resident memory of the current process in bytes,
+    or None when the platform does not expose it (e.g. Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+@profiled
+def load_transactions(file_path, chunk_size=DEFAULT_CHUNK_SIZE, report=True) -> pd.DataFrame:
+    """
+    Loads a transactions CSV file with an explicit schema, chunk by chunk,
+    and returns it sorted by date.
+
+    :param file_path: path of the CSV file
+    :param chunk_size: number of rows parsed at once
+    :param report: print rows parsed, bytes read and memory used
+    :return: pandas DataFrame with datetime64 Date, categorical Category/Type and Amount in cents
+    """
+    header = read_header(file_path)
+    if not required_fields.issubset(header):
+        raise ValueError("The required fields do not match your database.")
+
+    start = time.perf_counter()
+    progress = {'rows': 0, 'bytes': 0}
+    with profiler.operation('load_transactions.parse'):
+        df = concat_transactions(iter_transaction_chunks(file_path, chunk_size, progress=progress))
+
+    if not df['Date'].is_monotonic_increasing:
+        with profiler.operation('load_transactions.sort', len(df)):
+            df.sort_values(by='Date', kind='stable', inplace=True, ignore_index=True)
+
+    if report:
+        report_load(progress, df, time.perf_counter() - start)
+
+    return df
+
+
+def report_load(progress: dict, transactions: pd.DataFrame, elapsed: float):
+    """
+    Prints the rows parsed, bytes read, memory used and time taken by a load.
+
+    :param progress: dict with the 'rows' and 'bytes' read
+    :param transactions: the loaded dataframe
+    :param elapsed: load time in seconds
+    """
+    peak = peak_resident_memory()
+    print(f"\nRows parsed: {progress['rows']:,}")
+    print(f"Bytes read: {progress['bytes'] / 1024 ** 2:,.2f} MB")
+    print(f"Ledger memory: {transactions.memory_usage(deep=True).sum() / 1024 ** 2:,.2f} MB")
+    if peak is not None:
+        print(f"Peak resident memory: {peak / 1024 ** 2:,.2f} MB")
+    print(f"Load time: {elapsed:,.2f} s")
@@ -1,14 +1,45 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from utils import validate_index, get_valid_input
+from date_index import date_bounds, transactions_between, restore_order, merge_sorted, InsertBuffer
+from row_index import new_ids
+from pager import browse_transactions, render_page
+from profiling import profiled
+from money import parse_amount, format_amount, for_display
 
 # Set pandas options to display more rows and columns
-pd.set_option('display.max_rows', None)  # Display all rows
+pd.set_option('display.max_rows', 60)  # Larger frames print truncated; the pager browses them page by page
 pd.set_option('display.max_columns', None)  # Display all columns
 pd.set_option('display.width', None)  # Allow unlimited width, to avoid wrapping lines
-pd.set_option('display.max_colwidth', None)  # Prevent truncation of column content
+pd.set_option('display.max_colwidth', 80)  # Long descriptions are cut so one page stays one screen
 
-def add_transaction(transactions: pd.DataFrame):
+
+def set_transaction_value(transactions: pd.DataFrame, index, column, value):
+    """
+    Assigns a single cell, registering the value first when the column is categorical
+    (pandas refuses to store a category it does not know yet).
+    """
+    if isinstance(transactions[column].dtype, pd.CategoricalDtype) and value not in transactions[column].cat.categories:
+        transactions[column] = transactions[column].cat.add_categories([value])
+    transactions.loc[index, column] = value
+
+
+def _notify(listeners, event, *rows):
+    """
+    Forwards a change to every listener (e.g. an AggregateCache) that keeps
+    derived data in sync with the transactions.
+
+    :param listeners: iterable of objects implementing on_add, on_edit and on_delete
+    :param event: name of the method to call
+    :param rows: DataFrames describing the changed rows, indexed by their IDs
+    """
+    for listener in listeners:
+        getattr(listener, event)(*rows)
+
+
+@profiled
+def add_transaction(transactions: pd.DataFrame, listeners=(), buffer=None):
     today = datetime.today().date()
 
     # Validate date input
@@ -51,7 +82,7 @@ def add_transaction(transactions: pd.DataFrame):
     while new_amount is None:
         candidate = input("\nType the AMOUNT of the new transaction: ")
         try:
-            value = float(candidate)
+            value = parse_amount(candidate)  # exact cents, no binary rounding
             if value <= 0:
                 print("Invalid value. Amount must be greater than zero.")
             else:
@@ -70,79 +101,167 @@ def add_transaction(transactions: pd.DataFrame):
 
     # Create a new row as a dictionary and append it to the DataFrame
     new_row = {
-        "Date": new_date,
+        "Date": pd.Timestamp(new_date),
         "Category": new_category,
         "Description": new_description,
         "Amount": new_amount,
         "Type": new_type
     }
-    transactions.loc[len(transactions)] = new_row
+    # The row waits in the buffer and is merged in date order with the next batch;
+    # without a buffer it is merged right away (binary search, no full sort)
+    if buffer is None:
+        buffer = InsertBuffer(batch_size=1)
+    new_id = new_ids(transactions, 1)[0]
+    buffer.add(new_row, new_id)
+    if buffer.is_full():
+        transactions = buffer.merge(transactions)
 
-    transactions.sort_values(by='Date', inplace=True)
-    transactions.reset_index(drop=True, inplace=True)
+    _notify(listeners, 'on_add', pd.DataFrame([new_row], index=[new_id]))
 
     print("\nNew transaction added successfully!")
     print("\nNew Transaction Details:")
-    print(new_row)
+    print({**new_row, "Amount": format_amount(new_amount)})
+
+    return transactions
 
+@profiled
+def add_transactions(transactions: pd.DataFrame, new_transactions: pd.DataFrame, listeners=()):
+    """
+    Adds many transactions at once, e.g. a day of receipts.
+
+    :param transactions: pandas dataframe sorted by 'Date'
+    :param new_transactions: dataframe with the Date, Category, Description, Amount and Type columns
+    :param listeners: objects kept in sync with the transactions
+    :return: the updated, still sorted, dataframe
+    """
+    if new_transactions.empty:
+        return transactions
+    # IDs are given first, so the listeners see the rows as they are stored
+    new_transactions = new_transactions.set_axis(new_ids(transactions, len(new_transactions)))
+    transactions = merge_sorted(transactions, new_transactions, keep_ids=True)
+    _notify(listeners, 'on_add', new_transactions)
+    print(f"\n{len(new_transactions)} transactions added successfully!")
     return transactions
 
+
+@profiled
+def add_new_transactions(transactions: pd.DataFrame, new_transactions: pd.DataFrame, fingerprint_set, listeners=()):
+    """
+    Adds only the transactions the ledger does not have yet, e.g. when a bank
+    statement overlaps one imported before. The check is one vectorized lookup of
+    the row fingerprints (see fingerprints.py), never a comparison of rows.
+
+    :param transactions: pandas dataframe sorted by 'Date'
+    :param new_transactions: dataframe with the Date, Category, Description, Amount and Type columns
+    :param fingerprint_set: FingerprintSet of the ledger
+    :param listeners: objects kept in sync with the transactions
+    :return: (updated dataframe, number of transactions added, number of duplicates skipped)
+    """
+    fresh = new_transactions[fingerprint_set.unseen(new_transactions)]
+    if fingerprint_set not in listeners:
+        listeners = [*listeners, fingerprint_set]
+    transactions = add_transactions(transactions, fresh, listeners)
+    skipped = len(new_transactions) - len(fresh)
+    if skipped:
+        print(f"\n{skipped} transactions were already in the ledger and were skipped.")
+    return transactions, len(fresh), skipped
+
+
+@profiled
 def view_transaction(transaction: pd.DataFrame):
-    start_date = transaction["Date"].min()  # This will remain as datetime
-    end_date = transaction["Date"].max()    # This will remain as datetime
+    # The dataframe is sorted by date, so the first and last rows hold the bounds
+    start_date = transaction["Date"].iloc[0]
+    end_date = transaction["Date"].iloc[-1]
 
     print(f"\nAvailable transaction dates: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
 
     while True:
         try:
             date_input_init = input("\nType the start date (YYYY-MM-DD): ")
-            valid_init_date = datetime.strptime(date_input_init, "%Y-%m-%d").date()
+            valid_init_date = pd.Timestamp(datetime.strptime(date_input_init, "%Y-%m-%d"))
 
             date_input_end = input("Type the end date (YYYY-MM-DD): ")
-            valid_end_date = datetime.strptime(date_input_end, "%Y-%m-%d").date()
+            valid_end_date = pd.Timestamp(datetime.strptime(date_input_end, "%Y-%m-%d"))
 
             if valid_init_date > end_date or valid_end_date < start_date:  # Compare datetime objects
                 print("\nNo transactions in the given date range. Please try again.")
                 continue
 
             # Filter transactions by the user-provided date range
-            transactions_range_date = transaction[transaction["Date"].between(valid_init_date, valid_end_date)]  # Use datetime objects
+            # Binary search on the sorted dates instead of scanning every row
+            transactions_range_date = transactions_between(transaction, valid_init_date, valid_end_date)
 
             if transactions_range_date.empty:  # Check if no transactions found
                 print("\nNo transactions found in the selected date range. Please try again.")
                 continue  # Skip to next iteration
 
             print("\nTransactions found:")
-            print(transactions_range_date)
+            browse_transactions(transactions_range_date)
             return transactions_range_date
 
         except ValueError:
             print("\nInvalid date format. Please use YYYY-MM-DD.")  # Handling user mistakes
 
-def edit_transactions(transactions: pd.DataFrame):
+@profiled
+def search_transactions(transactions: pd.DataFrame, text_index):
+    """
+    Finds transactions by the words of their description or category, through the
+    TextIndex, optionally within a date range.
+
+    :param transactions: pandas dataframe sorted by 'Date'
+    :param text_index: TextIndex kept in sync with the transactions
+    :return: the matching rows (empty if none), or None if the search was canceled
+    """
+    query = input("\nSearch words (e.g. 'taxi', 'amaz*', 'phone bill'; end a word with * to match its beginning): ").strip()
+    if query == "":
+        print("\nSearch canceled.")
+        return None
+    match_all = input("Require ALL the words? (Y/N, default Y): ").strip().capitalize() != "N"
+
+    try:
+        start = input("Start date (YYYY-MM-DD, blank for all): ").strip()
+        start = pd.Timestamp(datetime.strptime(start, "%Y-%m-%d")) if start else None
+        end = input("End date (YYYY-MM-DD, blank for all): ").strip()
+        end = pd.Timestamp(datetime.strptime(end, "%Y-%m-%d")) if end else None
+    except ValueError:
+        print("\nInvalid date format. Please use YYYY-MM-DD.")
+        return None
+
+    found = text_index.select(transactions, query, start, end, match_all)
+    if found.empty:
+        print("\nNo transactions found.")
+        return found
+    print(f"\n{len(found)} transactions found:")
+    browse_transactions(found)
+    return found
+
+
+@profiled
+def edit_transactions(transactions: pd.DataFrame, listeners=(), row_index=None):
     today = datetime.today().date()  # Current date
+    deleted = row_index.deleted if row_index is not None else set()
 
-    print(transactions)  # Display transactions
+    browse_transactions(transactions, hidden=deleted)  # Display transactions, one page at a time
 
-    # Get transaction index with proper validation
+    # Get the transaction ID with proper validation (IDs are the index printed on the left)
     index_transaction = get_valid_input(
         "Enter the INDEX of the transaction to edit",
         None,
-        lambda i: validate_index(i, transactions)
+        lambda i: validate_index(i, transactions, deleted)
     )
 
     print("\nCurrent Transaction Details:")
     # Copy the row and format date
-    transaction_details = transactions.iloc[index_transaction].copy()
+    transaction_details = for_display(transactions.loc[index_transaction])
     transaction_details["Date"] = transaction_details["Date"].strftime("%Y-%m-%d")
     print(transaction_details)
 
-    # Get updated values, now using the date object directly for the default value
-    new_date = get_valid_input(
+    # Get updated values; the current date is shown as YYYY-MM-DD and parsed back when kept
+    new_date = pd.Timestamp(get_valid_input(
         "Enter new DATE (YYYY-MM-DD)",
-        transactions.at[index_transaction, "Date"],
+        transactions.at[index_transaction, "Date"].strftime("%Y-%m-%d"),
         lambda d: datetime.strptime(d, "%Y-%m-%d").date() if datetime.strptime(d, "%Y-%m-%d").date() <= today else (_ for _ in ()).throw(ValueError("Date cannot be in the future"))
-    )
+    ))
 
     new_category = get_valid_input(
         "Enter new CATEGORY",
@@ -156,11 +275,11 @@ def edit_transactions(transactions: pd.DataFrame):
         lambda d: d
     )
 
-    new_amount = get_valid_input(
+    new_amount = parse_amount(get_valid_input(
         "Enter new AMOUNT",
-        transactions.at[index_transaction, "Amount"],
-        lambda a: float(a) if float(a) > 0 else (_ for _ in ()).throw(ValueError("Amount must be greater than zero"))
-    )
+        format_amount(transactions.at[index_transaction, "Amount"]),
+        lambda a: a if parse_amount(a) > 0 else (_ for _ in ()).throw(ValueError("Amount must be greater than zero"))
+    ))
 
     new_type = get_valid_input(
         "Enter new TYPE (Expense/Income)",
@@ -168,23 +287,34 @@ def edit_transactions(transactions: pd.DataFrame):
         lambda t: t.capitalize() if t.capitalize() in ["Expense", "Income"] else (_ for _ in ()).throw(ValueError("Must be 'Expense' or 'Income'"))
     )
 
-    transactions.loc[index_transaction, "Date"] = new_date
-    transactions.loc[index_transaction, "Category"] = new_category
-    transactions.loc[index_transaction, "Description"] = new_description
-    transactions.loc[index_transaction, "Amount"] = new_amount
-    transactions.loc[index_transaction, "Type"] = new_type
+    old_transaction = transactions.loc[[index_transaction]].copy()
+
+    set_transaction_value(transactions, index_transaction, "Date", new_date)
+    set_transaction_value(transactions, index_transaction, "Category", new_category)
+    set_transaction_value(transactions, index_transaction, "Description", new_description)
+    set_transaction_value(transactions, index_transaction, "Amount", new_amount)
+    set_transaction_value(transactions, index_transaction, "Type", new_type)
+
+    # Move the row back into date order if its date changed (its ID moves with it)
+    if new_date != old_transaction["Date"].iloc[0]:
+        restore_order(transactions, transactions.index.get_loc(index_transaction))
+
+    _notify(listeners, 'on_edit', old_transaction, transactions.loc[[index_transaction]])
 
     print("\n✅ Transaction updated successfully!")
     print("\nUpdated Transaction Details:")
-    updated_transaction = transactions.iloc[index_transaction].copy()
+    updated_transaction = for_display(transactions.loc[index_transaction])
     updated_transaction["Date"] = updated_transaction["Date"].strftime("%Y-%m-%d")
     print(updated_transaction)
 
 
-def delete_transaction(transaction: pd.DataFrame):
+@profiled
+def delete_transaction(transaction: pd.DataFrame, listeners=(), row_index=None):
+    deleted_ids = row_index.deleted if row_index is not None else set()
     while True:
         try:
-            print("\nCurrent Transaction List:\n", transaction)  # Show transactions before deletion
+            print("\nCurrent Transaction List:")
+            browse_transactions(transaction, hidden=deleted_ids)  # Show transactions before deletion
 
             index_transaction_del = input(
                 "\nChoose the INDEX of the transaction that you want to DELETE (or type 'C' to cancel): ").strip().capitalize()
@@ -199,21 +329,31 @@ def delete_transaction(transaction: pd.DataFrame):
 
             index_transaction_del = int(index_transaction_del)
 
-            if index_transaction_del < 0 or index_transaction_del >= len(transaction):  # Check if index is valid
+            # The index holds the transaction IDs, so this is a hash lookup
+            if index_transaction_del not in transaction.index or index_transaction_del in deleted_ids:
                 print("\nInvalid index. Please choose a valid transaction.")
                 continue
 
             print("\nCurrent Transaction Details:")
-            print(transaction.iloc[index_transaction_del])  # Show selected transaction
+            transaction_details = for_display(transaction.loc[index_transaction_del])
+            transaction_details["Date"] = transaction_details["Date"].strftime("%Y-%m-%d")
+            print(transaction_details)  # Show selected transaction
 
             confirm_del = input("\nAre you sure you want to delete this transaction? (Y to confirm, N to cancel): ").strip().capitalize()
-            print("\nWARNING! This Processes isn't reversible.")
+            print("\nA deletion can be undone from the main menu (Undo, Redo or Snapshots).")
             if confirm_del == "Y":
-                transaction.drop(index_transaction_del, inplace = True)  # Delete the row
-                transaction.reset_index(drop = True, inplace = True)  # Reset index after deletion
+                deleted = transaction.loc[[index_transaction_del]].copy()
+                position = transaction.index.get_loc(index_transaction_del)
+                if row_index is not None:
+                    row_index.delete(index_transaction_del)  # O(1) tombstone, dropped later in one pass
+                else:
+                    transaction.drop(index_transaction_del, inplace = True)  # Delete the row
+                _notify(listeners, 'on_delete', deleted)
                 print("\nTransaction deleted successfully!")
 
-                print("\nUpdated Transaction List:\n", transaction)  # Show updated transactions
+                # Show the page around the deleted row instead of the whole list
+                print("\nUpdated Transaction List:\n",
+                      render_page(transaction, max(0, position - 5), hidden=deleted_ids))
 
                 # Ask user if they want to delete another transaction
                 new_del = input("\nWould you like to delete another transaction? (Y/N): ").strip().capitalize()
@@ -232,3 +372,141 @@ def delete_transaction(transaction: pd.DataFrame):
             print("\nInvalid input. Please try again.")
 
 
+def select_transactions(transactions: pd.DataFrame, description=None, category=None, kind=None,
+                        start=None, end=None, deleted=()) -> np.ndarray:
+    """
+    Builds one boolean mask for every row matching all the given filters.
+    The date range is found with a binary search; the other filters are vectorized
+    comparisons over the columns, never a Python loop over the rows.
+
+    :param transactions: pandas dataframe sorted by 'Date'
+    :param description: text the description must contain (case-insensitive)
+    :param category: exact category
+    :param kind: 'Expense' or 'Income'
+    :param start: first date of the range
+    :param end: last date of the range
+    :param deleted: IDs of tombstoned rows, never selected
+    :return: numpy boolean array aligned with the rows
+    """
+    mask = np.zeros(len(transactions), dtype=bool)
+    lo, hi = 0, len(transactions)
+    if start is not None or end is not None:
+        lo, hi = date_bounds(transactions,
+                             start if start is not None else transactions["Date"].iloc[0],
+                             end if end is not None else transactions["Date"].iloc[-1])
+    mask[lo:hi] = True
+
+    rows = transactions.iloc[lo:hi]
+    if description:
+        mask[lo:hi] &= rows["Description"].str.contains(description, case=False, regex=False, na=False).to_numpy()
+    if category:
+        mask[lo:hi] &= (rows["Category"] == category).to_numpy()
+    if kind:
+        mask[lo:hi] &= (rows["Type"] == kind).to_numpy()
+    if deleted:
+        mask &= ~transactions.index.isin(list(deleted))
+    return mask
+
+
+@profiled
+def bulk_edit(transactions: pd.DataFrame, mask: np.ndarray, changes: dict, listeners=()) -> int:
+    """
+    Sets the same Category, Description and/or Type on every selected row, with one
+    vectorized assignment per column and one notification for the whole batch.
+
+    :param transactions: pandas dataframe
+    :param mask: boolean array from select_transactions
+    :param changes: {column: new value}
+    :param listeners: objects kept in sync with the transactions
+    :return: number of rows changed
+    """
+    count = int(mask.sum())
+    if count == 0 or not changes:
+        return 0
+    old_rows = transactions.loc[mask].copy()
+    for column, value in changes.items():
+        if isinstance(transactions[column].dtype, pd.CategoricalDtype) and value not in transactions[column].cat.categories:
+            transactions[column] = transactions[column].cat.add_categories([value])
+        transactions.loc[mask, column] = value
+    _notify(listeners, 'on_edit', old_rows, transactions.loc[mask])
+    return count
+
+
+@profiled
+def bulk_delete(transactions: pd.DataFrame, mask: np.ndarray, listeners=(), row_index=None) -> pd.DataFrame:
+    """
+    Deletes every selected row at once: tombstones when a RowIndex is given,
+    otherwise a single pass that keeps the other rows.
+
+    :return: the transactions without the deleted rows
+    """
+    if not mask.any():
+        return transactions
+    deleted = transactions.loc[mask].copy()
+    if row_index is not None:
+        for transaction_id in deleted.index:
+            row_index.delete(transaction_id)
+    else:
+        transactions = transactions[~mask]
+    _notify(listeners, 'on_delete', deleted)
+    return transactions
+
+
+@profiled
+def bulk_operation(transactions: pd.DataFrame, listeners=(), row_index=None) -> pd.DataFrame:
+    """
+    Interactive bulk edit/delete: asks for filters, shows how many rows match
+    (dry run) and applies the chosen change to all of them at once.
+    """
+    deleted_ids = row_index.deleted if row_index is not None else set()
+
+    print("\nFilter the transactions (leave blank to skip a filter).")
+    description = input("DESCRIPTION contains: ").strip()
+    category = input("CATEGORY is: ").strip().capitalize()
+    kind = input("TYPE is (Expense or Income): ").strip().capitalize()
+    try:
+        start = input("Start date (YYYY-MM-DD): ").strip()
+        start = pd.Timestamp(datetime.strptime(start, "%Y-%m-%d")) if start else None
+        end = input("End date (YYYY-MM-DD): ").strip()
+        end = pd.Timestamp(datetime.strptime(end, "%Y-%m-%d")) if end else None
+    except ValueError:
+        print("\nInvalid date format. Please use YYYY-MM-DD.")
+        return transactions
+
+    mask = select_transactions(transactions, description, category, kind, start, end, deleted_ids)
+    count = int(mask.sum())
+    print(f"\n{count} transactions match.")
+    if count == 0:
+        return transactions
+    print(render_page(transactions[mask], 0))
+
+    action = input("\n[E] edit them, [D] delete them, [C] cancel: ").strip().capitalize()
+    if action == "E":
+        changes = {}
+        new_category = input("New CATEGORY (blank to keep): ").strip()
+        if new_category:
+            if not new_category.replace(" ", "").isalpha():
+                print("Invalid input. Please use only alphabetic characters for the category.")
+                return transactions
+            changes["Category"] = new_category.capitalize()
+        new_description = input("New DESCRIPTION (blank to keep): ").strip()
+        if new_description:
+            changes["Description"] = new_description.capitalize()
+        new_type = input("New TYPE (Expense or Income, blank to keep): ").strip().capitalize()
+        if new_type:
+            if new_type not in ["Expense", "Income"]:
+                print("Invalid type. Please enter either 'Expense' or 'Income'.")
+                return transactions
+            changes["Type"] = new_type
+        if not changes:
+            print("\nNothing to change.")
+            return transactions
+        if input(f"\nApply to {count} transactions? (Y/N): ").strip().capitalize() == "Y":
+            print(f"\n{bulk_edit(transactions, mask, changes, listeners)} transactions updated successfully!")
+    elif action == "D":
+        if input(f"\nDelete {count} transactions? (Y/N): ").strip().capitalize() == "Y":
+            transactions = bulk_delete(transactions, mask, listeners, row_index)
+            print(f"\n{count} transactions deleted successfully!")
+    else:
+        print("\nOperation canceled.")
+    return transactions
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from data_loader import concat_transactions
+from row_index import new_ids
+from profiling import profiled
+
+# Pending transactions merged into the ledger at once by InsertBuffer
+DEFAULT_BATCH_SIZE = 100
+
+# The transactions DataFrame is always kept sorted by its datetime64 'Date' column
+# (the loader sorts it, add_transaction inserts in order and edit_transactions moves
+# an edited row back into place), so that column doubles as a sorted date index.
+
+
+def date_bounds(transactions: pd.DataFrame, start, end):
+    """
+    Binary-searches the positions of the rows dated between start and end (inclusive).
+
+    :param transactions: pandas dataframe sorted by 'Date'
+    :param start: first date of the range
+    :param end: last date of the range
+    :return: (first position, position after the last match)
+    """
+    dates = transactions['Date'].to_numpy()
+    lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side='left')
+    hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side='right')
+    return int(lo), int(max(lo, hi))
+
+
+def transactions_between(transactions: pd.DataFrame, start, end) -> pd.DataFrame:
+    """
+    Returns the rows dated between start and end (inclusive) in O(log n + k).
+    The result is a positional slice, so pandas does not copy the matching rows.
+    """
+    lo, hi = date_bounds(transactions, start, end)
+    return transactions.iloc[lo:hi]
+
+
+def insertion_point(transactions: pd.DataFrame, date) -> int:
+    """
+    Position where a transaction dated `date` goes to keep the dataframe sorted
+    (after any transaction already on that date).
+    """
+    dates = transactions['Date'].to_numpy()
+    return int(np.searchsorted(dates, np.datetime64(pd.Timestamp(date)), side='right'))
+
+
+@profiled
+def restore_order(transactions: pd.DataFrame, position: int) -> int:
+    """
+    Moves the row at `position` to where its (edited) date belongs, shifting the rows
+    in between in place. Only the rows between the old and new position are touched,
+    except for the row IDs: pandas indexes are immutable, so they are rebuilt.
+
+    :return: the new position of the row
+    """
+    dates = transactions['Date'].to_numpy()
+    date = dates[position]
+    target = int(np.searchsorted(dates[:position], date, side='right'))
+    if target == position:
+        target = position + int(np.searchsorted(dates[position + 1:], date, side='right'))
+    if target == position:
+        return position
+
+    if target < position:
+        lo, hi = target, position + 1
+        order = [position] + list(range(target, position))
+    else:
+        lo, hi = position, target + 1
+        order = list(range(position + 1, target + 1)) + [position]
+
+    for column in range(transactions.shape[1]):
+        transactions.iloc[lo:hi, column] = transactions.iloc[order, column].to_numpy()
+    # The IDs move with their rows
+    ids = transactions.index.to_numpy().copy()
+    ids[lo:hi] = ids[order]
+    transactions.index = ids
+    return target
+
+
+@profiled
+def merge_sorted(transactions: pd.DataFrame, new_rows: pd.DataFrame, keep_ids=False) -> pd.DataFrame:
+    """
+    Merges new rows into the sorted dataframe. Each new row finds its position with a
+    binary search and the result is built with a single take, so merging k rows costs
+    O(k log n + n) instead of re-sorting the whole ledger.
+
+    :param transactions: pandas dataframe sorted by 'Date'
+    :param new_rows: transactions to insert, in any order
+    :param keep_ids: keep the IDs of new_rows (rows coming back after an undo) instead of giving fresh ones
+    :return: new sorted dataframe; existing rows keep their IDs and new rows get fresh ones
+    """
+    if new_rows.empty:
+        return transactions
+    new_rows = new_rows.assign(Date=pd.to_datetime(new_rows['Date'])).sort_values(by='Date', kind='stable')
+    if not keep_ids:
+        new_rows.index = new_ids(transactions, len(new_rows))
+    positions = np.searchsorted(transactions['Date'].to_numpy(), new_rows['Date'].to_numpy(), side='right')
+
+    n = len(transactions)
+    order = np.insert(np.arange(n), positions, np.arange(n, n + len(new_rows)))
+    merged = concat_transactions([transactions, new_rows[list(transactions.columns)]], ignore_index=False)
+    return merged.take(order)
+
+
+class InsertBuffer:
+    """
+    Holds transactions added since the last merge. They are merged into the sorted
+    ledger in one batch, when the buffer is full or before the ledger is read.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.rows = []
+        self.ids = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, row: dict, transaction_id):
+        # The ID is given when the row is added, so listeners can refer to it before the merge
+        self.rows.append(row)
+        self.ids.append(transaction_id)
+
+    def is_full(self) -> bool:
+        return len(self.rows) >= self.batch_size
+
+    def merge(self, transactions: pd.DataFrame) -> pd.DataFrame:
+        """
+        Merges the pending rows into the ledger and empties the buffer.
+        """
+        if not self.rows:
+            return transactions
+        merged = merge_sorted(transactions, pd.DataFrame(self.rows, index=self.ids), keep_ids=True)
+        self.rows = []
+        self.ids = []
+        return merged
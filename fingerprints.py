@@ -0,0 +1,198 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from data_loader import TRANSACTION_COLUMNS
+from profiling import profiled
+from money import to_cents
+
+# Every transaction gets a 64-bit fingerprint: a hash of its five fields plus its
+# occurrence number, so two identical coffees on the same day are two different
+# fingerprints. Importing a statement then keeps only the fingerprints the ledger
+# does not have yet, which also handles overlapping statements: a repeated row is
+# added only as many times as it appears in a single statement.
+
+FINGERPRINT_SUFFIX = '.fingerprints.npz'
+# Spreads the occurrence number over all 64 bits (golden ratio constant)
+_OCCURRENCE_STEP = np.uint64(0x9E3779B97F4A7C15)
+
+
+def row_hashes(rows: pd.DataFrame) -> np.ndarray:
+    """
+    Content hash of the Date, Category, Description, Amount and Type of every row,
+    independent of the dtypes the columns happen to have (object or categorical,
+    any datetime unit, amounts in cents or in currency units).
+    """
+    # Categorical columns hash by value, so they are left as they are
+    normalized = pd.DataFrame({
+        'Date': pd.to_datetime(rows['Date']).astype('datetime64[ns]').to_numpy(),
+        'Category': rows['Category'].array,
+        'Description': rows['Description'].array,
+        'Amount': _cents(rows['Amount']),
+        'Type': rows['Type'].array,
+    }, columns=TRANSACTION_COLUMNS)
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+
+def _cents(amounts: pd.Series) -> np.ndarray:
+    # Integer columns already hold cents; floats are units from an older ledger or a raw frame
+    if pd.api.types.is_integer_dtype(amounts):
+        return amounts.to_numpy(dtype='int64')
+    return to_cents(amounts)
+
+
+def _occurrences(hashes: np.ndarray) -> np.ndarray:
+    # 0 for the first row with a given hash, 1 for the second one, and so on
+    return pd.Series(hashes).groupby(hashes, sort=False).cumcount().to_numpy(dtype=np.uint64)
+
+
+def _sorted_unique(values) -> np.ndarray:
+    # np.sort plus a neighbour comparison; faster than np.unique on large uint64 arrays
+    values = np.sort(np.asarray(values, dtype=np.uint64))
+    if len(values):
+        values = values[np.concatenate(([True], values[1:] != values[:-1]))]
+    return values
+
+
+def _combine(hashes: np.ndarray, occurrences: np.ndarray) -> np.ndarray:
+    with np.errstate(over='ignore'):
+        return hashes + occurrences.astype(np.uint64) * _OCCURRENCE_STEP
+
+
+def fingerprints(rows: pd.DataFrame) -> np.ndarray:
+    """
+    Fingerprints of the rows, numbering repeated rows within `rows` from 0.
+    """
+    hashes = row_hashes(rows)
+    return _combine(hashes, _occurrences(hashes))
+
+
+class FingerprintSet:
+    """
+    Set of the fingerprints of every transaction in the ledger.
+
+    The bulk is one sorted uint64 array searched with np.searchsorted, so checking
+    m incoming rows against n known ones costs O(m log n) and no row is ever compared
+    with another. Changes made through the listeners go into two small Python sets
+    and are merged into the array by flush().
+    """
+
+    def __init__(self, known=None):
+        self.known = _sorted_unique(known) if known is not None else np.empty(0, np.uint64)
+        self.added = set()
+        self.removed = set()
+
+    @classmethod
+    @profiled
+    def from_transactions(cls, transactions: pd.DataFrame):
+        return cls(fingerprints(transactions))
+
+    def __len__(self):
+        return len(self.known) - len(self.removed) + len(self.added)
+
+    def contains(self, values: np.ndarray) -> np.ndarray:
+        """
+        Boolean mask of the fingerprints that are in the set.
+        """
+        values = np.asarray(values, dtype=np.uint64)
+        position = np.searchsorted(self.known, values)
+        found = self.known[np.minimum(position, len(self.known) - 1)] == values if len(self.known) else \
+            np.zeros(len(values), dtype=bool)
+        if self.removed:
+            found &= ~np.isin(values, np.fromiter(self.removed, np.uint64, len(self.removed)))
+        if self.added:
+            found |= np.isin(values, np.fromiter(self.added, np.uint64, len(self.added)))
+        return found
+
+    @profiled
+    def unseen(self, rows: pd.DataFrame) -> np.ndarray:
+        """
+        Boolean mask of the rows that are not in the ledger yet, in one vectorized pass.
+        A row repeated k times in `rows` is new only beyond the copies the ledger has.
+        """
+        return ~self.contains(fingerprints(rows))
+
+    def _counts(self, hashes: np.ndarray):
+        """
+        For each distinct hash, how many occurrences the set already holds.
+        Probes occurrence 0, 1, 2... until none is found (usually one or two rounds).
+        """
+        unique, inverse = np.unique(hashes, return_inverse=True)
+        counts = np.zeros(len(unique), dtype=np.uint64)
+        probing = np.arange(len(unique))
+        while len(probing):
+            present = self.contains(_combine(unique[probing], counts[probing]))
+            probing = probing[present]
+            counts[probing] += np.uint64(1)
+        return counts[inverse]
+
+    def on_add(self, rows: pd.DataFrame):
+        hashes = row_hashes(rows)
+        new = _combine(hashes, self._counts(hashes) + _occurrences(hashes))
+        for value in new.tolist():
+            if value in self.removed:
+                self.removed.discard(value)
+            else:
+                self.added.add(value)
+
+    def on_delete(self, rows: pd.DataFrame):
+        # Removes the highest occurrences, so the remaining ones stay numbered 0..k-1
+        hashes = row_hashes(rows)
+        gone = _combine(hashes, self._counts(hashes) - _occurrences(hashes) - np.uint64(1))
+        for value in gone.tolist():
+            if value in self.added:
+                self.added.discard(value)
+            else:
+                self.removed.add(value)
+
+    def on_edit(self, old_rows: pd.DataFrame, new_rows: pd.DataFrame):
+        self.on_delete(old_rows)
+        self.on_add(new_rows)
+
+    def update(self, values: np.ndarray):
+        """
+        Adds fingerprints computed elsewhere (e.g. by fingerprints()) straight to the array.
+        """
+        self.known = _sorted_unique(np.concatenate([self.known, np.asarray(values, dtype=np.uint64)]))
+
+    def flush(self):
+        """
+        Merges the pending changes into the sorted array.
+        """
+        if self.removed:
+            self.known = self.known[~np.isin(self.known, np.fromiter(self.removed, np.uint64, len(self.removed)))]
+        if self.added:
+            self.known = _sorted_unique(np.concatenate([self.known, np.fromiter(self.added, np.uint64, len(self.added))]))
+        self.added.clear()
+        self.removed.clear()
+
+    def save(self, ledger_path):
+        """
+        Writes the set next to the ledger file, stamped with that file's size and
+        modification time so a set written for another version of it is never used.
+        Call it right after the ledger file itself is written.
+        """
+        self.flush()
+        temp_path = f"{ledger_path}.tmp{FINGERPRINT_SUFFIX}"
+        np.savez(temp_path, known=self.known, signature=json.dumps(_signature(ledger_path)))
+        os.replace(temp_path, f"{ledger_path}{FINGERPRINT_SUFFIX}")
+
+    @classmethod
+    def open(cls, ledger_path, transactions: pd.DataFrame):
+        """
+        Loads the set saved for the ledger file, or builds it from the transactions
+        when there is none or it belongs to another version of the file.
+        """
+        path = f"{ledger_path}{FINGERPRINT_SUFFIX}"
+        if os.path.exists(path):
+            with np.load(path) as saved:
+                if json.loads(str(saved['signature'])) == _signature(ledger_path):
+                    fingerprint_set = cls()
+                    fingerprint_set.known = saved['known']
+                    return fingerprint_set
+        return cls.from_transactions(transactions)
+
+
+def _signature(ledger_path) -> dict:
+    stat = os.stat(ledger_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
@@ -0,0 +1,262 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from data_loader import TRANSACTION_COLUMNS
+from date_index import date_bounds, restore_order, merge_sorted
+from columnar_store import write_transactions
+from money import parse_amount, format_amount
+
+# Saving folds the journal into the base file once it holds this many entries
+COMPACT_THRESHOLD = 1000
+
+
+def _to_records(rows: pd.DataFrame) -> list:
+    """
+    Converts transaction rows into JSON friendly dictionaries.
+    """
+    records = []
+    for date, category, description, amount, kind in rows[TRANSACTION_COLUMNS].itertuples(index=False):
+        records.append({
+            'Date': pd.Timestamp(date).strftime('%Y-%m-%d'),
+            'Category': category,
+            'Description': description,
+            'Amount': format_amount(amount),
+            'Type': kind,
+        })
+    return records
+
+
+def _from_records(records: list) -> list:
+    """
+    Amounts back to cents: written as '12.50' text, or as floats by older journals.
+    """
+    return [{**record, 'Amount': parse_amount(record['Amount'])} for record in records]
+
+
+def _key(category, description, amount, kind) -> tuple:
+    # What identifies a journaled row within its day; a missing description is None
+    return category, None if pd.isna(description) else description, int(amount), kind
+
+
+def _merge(transactions: pd.DataFrame, records: list, ids: list) -> pd.DataFrame:
+    """
+    Merges the rows of add entries with the IDs they were given in their session.
+    Entries written before IDs were journaled, or IDs already taken, get fresh ones.
+    """
+    added = pd.DataFrame(records)
+    keep = None not in ids and len(set(ids)) == len(ids) and not transactions.index.isin(ids).any()
+    if keep:
+        added.index = ids
+    return merge_sorted(transactions, added, keep_ids=keep)
+
+
+class _RowFinder:
+    """
+    Finds the rows matching journal records. The rows of a day are read once and
+    kept as {content: [positions]}, so a whole entry is resolved in one pass over the
+    days it touches instead of a scan per record. Rows already claimed by a record
+    are skipped, which keeps identical rows apart.
+    """
+
+    def __init__(self, transactions: pd.DataFrame):
+        self.transactions = transactions
+        self.days = {}
+        self.deleted = set()  # positions of the rows deleted but not dropped yet
+
+    def forget(self, dates):
+        # The rows of these days were edited in place and are read again when needed
+        for date in dates:
+            self.days.pop(pd.Timestamp(date), None)
+
+    def claim(self, record: dict):
+        """
+        :return: position of an unclaimed row equal to the record, or None
+        """
+        date = pd.Timestamp(record['Date'])
+        if date not in self.days:
+            lo, hi = date_bounds(self.transactions, date, date)
+            rows = {}
+            for offset, row in enumerate(self.transactions.iloc[lo:hi][TRANSACTION_COLUMNS[1:]].itertuples(index=False)):
+                if lo + offset not in self.deleted:
+                    rows.setdefault(_key(*row), []).append(lo + offset)
+            for positions in rows.values():
+                positions.reverse()  # popped from the end, so the first row is claimed first
+            self.days[date] = rows
+        positions = self.days[date].get(_key(record['Category'], record['Description'], record['Amount'], record['Type']))
+        return positions.pop() if positions else None
+
+    def claim_all(self, records: list):
+        """
+        :return: (indexes of the records found, positions of their rows)
+        """
+        positions = [self.claim(record) for record in records]
+        found = [index for index, position in enumerate(positions) if position is not None]
+        return found, np.array([positions[index] for index in found], dtype=np.int64)
+
+
+def _drop(transactions: pd.DataFrame, dropped: list) -> pd.DataFrame:
+    # One copy for all the deletes gathered so far (lists of IDs)
+    if not dropped:
+        return transactions
+    return transactions[~transactions.index.isin(np.concatenate(dropped))]
+
+
+def _moves(transactions: pd.DataFrame, positions: np.ndarray, new_rows, found: list) -> bool:
+    # Whether an edit changes the date of some row
+    if new_rows is None or not len(positions):
+        return False
+    dates = pd.to_datetime(new_rows['Date'].iloc[found]).to_numpy()
+    return bool((transactions['Date'].to_numpy()[positions] != dates).any())
+
+
+def _assign(transactions: pd.DataFrame, positions: np.ndarray, new_rows: pd.DataFrame) -> bool:
+    """
+    Writes the new values over the rows at `positions`, one assignment per column,
+    then moves the rows whose date changed back into date order, as edit_transactions does.
+
+    :return: True when some row moved
+    """
+    if not len(positions):
+        return False
+    dates = pd.to_datetime(new_rows['Date']).to_numpy()
+    moved = transactions.index[positions[transactions['Date'].to_numpy()[positions] != dates]]
+    for column in TRANSACTION_COLUMNS:
+        values = dates if column == 'Date' else new_rows[column].to_numpy()
+        if isinstance(transactions[column].dtype, pd.CategoricalDtype):
+            missing = set(values) - set(transactions[column].cat.categories)
+            if missing:
+                transactions[column] = transactions[column].cat.add_categories(sorted(missing))
+        transactions.iloc[positions, transactions.columns.get_loc(column)] = values
+    for transaction_id in moved:
+        restore_order(transactions, transactions.index.get_loc(transaction_id))
+    return len(moved) > 0
+
+
+class Journal:
+    """
+    Append-only log of every add, edit and delete made since the base file was
+    last written. Saving only has to flush the new entries, and a crash loses at
+    most the entry being written. compact() folds the journal back into the base file.
+    """
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.path = f"{base_path}.journal"
+        self.entries = 0
+        self._handle = None
+
+    def _signature(self) -> dict:
+        # Identifies the base file the entries apply to
+        stat = os.stat(self.base_path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _append(self, entry: dict):
+        if self._handle is None:
+            self._handle = open(self.path, 'a', encoding='utf-8')
+        self._handle.write(json.dumps(entry) + '\n')
+        self._handle.flush()
+        self.entries += 1
+
+    def _start(self):
+        # A fresh journal always begins with the signature of its base file
+        if self._handle is not None:
+            self._handle.close()
+        self._handle = open(self.path, 'w', encoding='utf-8')
+        self._handle.write(json.dumps({'op': 'base', **self._signature()}) + '\n')
+        self._handle.flush()
+        self.entries = 0
+
+    def on_add(self, rows: pd.DataFrame):
+        self._append({'op': 'add', 'ids': rows.index.tolist(), 'rows': _to_records(rows)})
+
+    def on_delete(self, rows: pd.DataFrame):
+        self._append({'op': 'delete', 'rows': _to_records(rows)})
+
+    def on_edit(self, old_rows: pd.DataFrame, new_rows: pd.DataFrame):
+        self._append({'op': 'edit', 'old': _to_records(old_rows), 'new': _to_records(new_rows)})
+
+    def replay(self, transactions: pd.DataFrame) -> pd.DataFrame:
+        """
+        Applies the journal entries to the freshly loaded base file.
+
+        :param transactions: the base file, sorted by 'Date'
+        :return: the transactions as they were after the last journaled change
+        """
+        if not os.path.exists(self.path):
+            self._start()
+            return transactions
+
+        with open(self.path, encoding='utf-8') as handle:
+            lines = [json.loads(line) for line in handle if line.strip()]
+
+        if not lines or lines[0].get('op') != 'base' or {k: lines[0].get(k) for k in ('size', 'mtime_ns')} != self._signature():
+            # Written for another version of the base file (e.g. it was already compacted)
+            print("\nWARNING! The journal does not match the CSV file and was set aside.")
+            os.replace(self.path, f"{self.path}.stale")
+            self._start()
+            return transactions
+
+        # Deletes are gathered (by ID, which survives the moves) and dropped together; added
+        # rows wait to be merged in one pass, unless a later entry needs them in place
+        pending, ids, dropped = [], [], []
+        finder = _RowFinder(transactions)
+        for entry in lines[1:]:
+            if entry['op'] == 'add':
+                pending.extend(_from_records(entry['rows']))
+                ids.extend(entry.get('ids', [None] * len(entry['rows'])))
+                continue
+            old_rows = _from_records(entry['rows'] if entry['op'] == 'delete' else entry['old'])
+            new_rows = pd.DataFrame(_from_records(entry['new'])) if entry['op'] == 'edit' else None
+            found, positions = finder.claim_all(old_rows)
+            if pending and (len(found) < len(old_rows) or _moves(transactions, positions, new_rows, found)):
+                # The entry changes rows added earlier in the journal, or moves rows among
+                # them: they are merged first, as the session had done
+                transactions = _merge(_drop(transactions, dropped), pending, ids)
+                pending, ids, dropped = [], [], []
+                finder = _RowFinder(transactions)
+                found, positions = finder.claim_all(old_rows)
+            if new_rows is None:
+                dropped.append(transactions.index[positions])
+                finder.deleted.update(positions.tolist())
+            elif _assign(transactions, positions, new_rows.iloc[found]):
+                # Rows moved to their new dates, so the positions known so far are stale
+                transactions, dropped = _drop(transactions, dropped), []
+                finder = _RowFinder(transactions)
+            else:
+                finder.forget(new_rows['Date'].unique())
+        transactions = _merge(_drop(transactions, dropped), pending, ids)
+
+        self.entries = len(lines) - 1
+        self._handle = open(self.path, 'a', encoding='utf-8')
+        if self.entries:
+            print(f"\nReplayed {self.entries} journal entries.")
+        return transactions
+
+    def sync(self):
+        """
+        Makes sure every entry written so far is on disk. Costs O(changes).
+        """
+        if self._handle is not None:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+
+    def close(self):
+        """
+        Closes the journal file at the end of a session.
+        """
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def compact(self, transactions: pd.DataFrame):
+        """
+        Rewrites the base file with the current transactions and starts an empty journal.
+        The base file is replaced atomically; if the process dies before the journal is
+        reset, the signature check on the next load discards the already applied entries.
+        """
+        root, extension = os.path.splitext(self.base_path)
+        temp_path = f"{root}.tmp{extension}"
+        write_transactions(transactions, temp_path)
+        os.replace(temp_path, self.base_path)
+        self._start()
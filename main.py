@@ -1,12 +1,23 @@
-import tkinter as tk
-from tkinter import filedialog
+import sys
 import pandas as pd
-from data_managment import add_transaction, view_transaction, delete_transaction, edit_transactions
-from visualization import spending_by_categories, monthly_spending_trend, spending_distribution
-from data_analysis import monthly_spending, top_5_spending_categories, spending_by_category
-
-# Required fields for the CSV file
-required_fields = {'Date', 'Category', 'Description', 'Amount', 'Type'}
+from data_managment import (add_transaction, view_transaction, delete_transaction, edit_transactions, bulk_operation,
+                             add_new_transactions, search_transactions)
+from data_analysis import monthly_spending, top_5_spending_categories, spending_by_category, spending_totals
+from data_loader import required_fields
+from columnar_store import LEDGER_SUFFIX, read_transactions, write_transactions
+from sqlite_store import SQLITE_SUFFIX, SqliteStore
+from validation import load_validated, quarantine, quarantine_path
+from aggregate_cache import AggregateCache
+from date_index import InsertBuffer
+from journal import Journal, COMPACT_THRESHOLD
+from multi_import import import_files
+from pager import browse_transactions
+from row_index import RowIndex
+from profiling import show_metrics, start_from_env
+from fingerprints import FingerprintSet
+from versions import VersionStore, manage_versions
+from text_index import TextIndex
+from spending_cube import SpendingCube
 
 
 def print_options():
@@ -24,11 +35,18 @@ def print_options():
         9. Visualize Monthly Spending Trend
         10. Save Transactions to CSV
         11. Exit
-        Choose an option (1-11)
+        12. Import a Folder of Statement Files
+        13. Bulk Edit or Delete Transactions
+        14. Show Performance Metrics
+        15. Add a Statement File (skips transactions already imported)
+        16. Undo, Redo or Snapshots
+        17. Search Transactions by Description or Category
+        18. Totals for Date Ranges, Months, Quarters or Years
+        Choose an option (0-18)
     """)
 
 
-def run_application(transactions: pd.DataFrame):
+def run_application(transactions: pd.DataFrame, journal=None, cache=None, store=None):
     if transactions.empty:
         print("\nYour database is empty! Please select a new one.\n")
         return
@@ -37,6 +55,33 @@ def run_application(transactions: pd.DataFrame):
         print("\nThe required fields do not match your database\n")
         return
 
+    # Imported here so the command-line mode (cli.py) never pays for matplotlib
+    from visualization import spending_by_categories, monthly_spending_trend, spending_distribution
+
+    # Totals are computed once here (unless the import already did) and then updated
+    # by every add, edit and delete. A database ledger is written change by change,
+    # with indexed statements, and groups its totals in SQL instead
+    if store is not None:
+        cache = store
+    elif cache is None:
+        cache = AggregateCache.from_transactions(transactions)
+    listeners = [cache] if journal is None else [cache, journal]
+    # Undo history: keeps only the rows each change touched
+    versions = VersionStore()
+    listeners.append(versions)
+    # Words of the descriptions and categories, for searching (option 17)
+    text_index = TextIndex.from_transactions(transactions)
+    listeners.append(text_index)
+    # New transactions are merged into the sorted ledger in batches
+    buffer = InsertBuffer()
+    # Deleted rows are only marked, then dropped together
+    row_index = RowIndex()
+    # Fingerprints of every row, built the first time a statement is added (option 15)
+    fingerprint_set = None
+    # Prefix sums of the daily totals, built the first time a date range is asked (option 18);
+    # a database answers the ranges itself
+    cube = store
+
     while True:
         print_options()
         try:
@@ -45,67 +90,233 @@ def run_application(transactions: pd.DataFrame):
             print("Invalid input. Please enter a number corresponding to an option.")
             continue
 
+        # Options 6-9 answer from the cached totals, and 18 from the cube once it is built;
+        # they only need to know whether the ledger is empty
+        totals_only = (user_choice in (6, 7, 8, 9) or (user_choice == 18 and cube is not None)) \
+            and len(transactions) > 0
+        # Every other option except adding reads the ledger, so pending rows are merged first
+        if user_choice not in (3, 14) and not totals_only:
+            transactions = buffer.merge(transactions)
+        # Editing, deleting and undoing skip tombstoned rows themselves, and the totals never
+        # see them; everything else needs them gone
+        if (user_choice not in (3, 4, 5, 13, 14, 16) and not totals_only) or row_index.needs_compaction(transactions):
+            transactions = row_index.compact(transactions)
+
         if user_choice == 0:
             choose_file()  # Open new file dialog
             return  # Exit the current loop to avoid nested loops
         elif user_choice == 1:
-            print(transactions)
+            browse_transactions(transactions)
         elif user_choice == 2:
             view_transaction(transactions)
         elif user_choice == 3:
-            add_transaction(transactions)
+            transactions = add_transaction(transactions, listeners, buffer)
         elif user_choice == 4:
-            edit_transactions(transactions)
+            edit_transactions(transactions, listeners, row_index)
         elif user_choice == 5:
-            delete_transaction(transactions)
+            delete_transaction(transactions, listeners, row_index)
         elif user_choice == 6:
-            spending_by_categories(transactions)
+            spending_by_categories(transactions, cache)
         elif user_choice == 7:
-            df_monthly = monthly_spending(transactions)
+            df_monthly = monthly_spending(transactions, cache)
             monthly_spending_trend(df_monthly)
         elif user_choice == 8:
-            total_spent_by_cat = spending_by_category(transactions)  # Returns a Series
+            total_spent_by_cat = spending_by_category(transactions, cache)  # Returns a Series
             top_5_spending_categories(total_spent_by_cat)
         elif user_choice == 9:
-            spending_distribution(transactions)
+            spending_distribution(transactions, cache)
         elif user_choice == 10:
-            transactions.to_csv("transactions.csv", index=False)
-            print("Transactions saved to transactions.csv")
+            if store is None and not cache.verify(transactions):
+                print("\nWARNING! Cached totals drifted from the transactions, rebuilding them.")
+                cache = AggregateCache.from_transactions(transactions)
+                listeners[0] = cache
+            if store is not None:
+                # Every change was already committed to the database
+                if fingerprint_set is not None:
+                    store.save_fingerprints(fingerprint_set, store.version())
+                print(f"All changes are saved in {store.path}")
+            elif journal is None:
+                write_transactions(transactions, "transactions.csv")
+                if fingerprint_set is not None:
+                    fingerprint_set.save("transactions.csv")
+                print("Transactions saved to transactions.csv")
+            elif journal.entries >= COMPACT_THRESHOLD:
+                journal.compact(transactions)
+                if fingerprint_set is not None:
+                    fingerprint_set.save(journal.base_path)
+                print(f"Transactions saved to {journal.base_path}")
+            else:
+                # Only the changes are written; they are folded into the CSV file later
+                journal.sync()
+                print(f"{journal.entries} changes saved to {journal.path}")
         elif user_choice == 11:
             print("Exiting application.")
             break
+        elif user_choice == 12:
+            choose_folder()
+            return  # Exit the current loop to avoid nested loops
+        elif user_choice == 13:
+            transactions = bulk_operation(transactions, listeners, row_index)
+        elif user_choice == 14:
+            show_metrics()
+        elif user_choice == 15:
+            if fingerprint_set is None:
+                # The saved set is only valid for the file exactly as it is on disk
+                if journal is not None and journal.entries == 0:
+                    fingerprint_set = FingerprintSet.open(journal.base_path, transactions)
+                elif store is not None:
+                    # Every change is already in the database, so its saved set is current
+                    fingerprint_set, _ = store.load_fingerprints()
+                else:
+                    fingerprint_set = FingerprintSet.from_transactions(transactions)
+                listeners.append(fingerprint_set)
+            transactions = choose_statement(transactions, listeners, fingerprint_set)
+        elif user_choice == 16:
+            transactions = manage_versions(versions, transactions, listeners, row_index)
+        elif user_choice == 17:
+            found = search_transactions(transactions, text_index)
+            if found is not None and not found.empty:
+                # The matches feed the same analysis as the whole ledger
+                action = input("\n[C] totals by category, [M] monthly totals, [Enter] back: ").strip().capitalize()
+                if action == "C":
+                    print(spending_by_category(found))
+                elif action == "M":
+                    monthly_spending(found)
+        elif user_choice == 18:
+            if cube is None:
+                # Kept up to date by every change from now on, so it is built only once per session
+                cube = SpendingCube.from_transactions(transactions)
+                listeners.append(cube)
+            spending_totals(cube)
         else:
             print("Please select a valid choice.")
 
 
+def load_file(file_path):
+    """
+    Loads a ledger or CSV file. CSV files are validated row by row; when some rows
+    break the rules the user can set them aside in a quarantine file and go on.
+
+    :return: the transactions, or None if the user cancelled
+    """
+    if file_path.endswith((LEDGER_SUFFIX, SQLITE_SUFFIX)):
+        return read_transactions(file_path)
+
+    df, errors, rejected = load_validated(file_path)
+    if errors.empty:
+        return df
+
+    print(f"\n{len(rejected)} rows do not follow the transaction rules:\n")
+    print(errors['error'].value_counts().to_string())
+    print(f"\n{errors.head(20).to_string(index=False)}")
+    destination = quarantine_path(file_path)
+    action = input(f"\n[Q] move them to {destination} and continue, [C] cancel: ").strip().capitalize()
+    if action != "Q":
+        print("\nImport canceled.")
+        return None
+    quarantine(rejected, destination)
+    print(f"\n{len(rejected)} rows saved to {destination}")
+    return df
+
+
 def choose_file():
+    import tkinter as tk
+    from tkinter import filedialog
+
     # Create a temporary Tk window for file selection
     temp_root = tk.Tk()
     temp_root.withdraw()
 
     file_path = filedialog.askopenfilename(
         title="Choose a CSV File",
-        filetypes=(("CSV files", "*.csv"), ("All files", "*.*"))
+        filetypes=(("CSV files", "*.csv"), ("Ledger files", "*.ledger"), ("SQLite databases", "*.db"),
+                   ("All files", "*.*"))
     )
     temp_root.destroy()  # Destroy the temporary window
 
     if file_path:
-        data = pd.read_csv(file_path)
-        df = pd.DataFrame(data)
-        df['Date'] = pd.to_datetime(df['Date']).dt.date
-        df.sort_values(by='Date', inplace=True)
+        try:
+            df = load_file(file_path)
+        except ValueError as e:
+            print(f"\n{e}\n")
+        else:
+            if df is None:
+                return
+            if file_path.endswith(SQLITE_SUFFIX):
+                # The database is always up to date, there is no journal to replay
+                print("\nFile loaded successfully!")
+                store = SqliteStore(file_path)
+                try:
+                    run_application(df, store=store)
+                finally:
+                    store.close()
+                return
+            # Changes saved in earlier sessions but not yet folded into the file
+            journal = Journal(file_path)
+            df = journal.replay(df)
+            print("\nFile loaded successfully!")
+            try:
+                run_application(df, journal)
+            finally:
+                journal.close()
+    else:
+        print("No file selected.")
 
-        if not required_fields.issubset(df.columns):
-            print("\nThe required fields do not match your database.\n")
 
+def choose_statement(transactions: pd.DataFrame, listeners, fingerprint_set) -> pd.DataFrame:
+    import tkinter as tk
+    from tkinter import filedialog
+
+    temp_root = tk.Tk()
+    temp_root.withdraw()
+
+    file_path = filedialog.askopenfilename(
+        title="Choose a Statement File",
+        filetypes=(("CSV files", "*.csv"), ("Ledger files", "*.ledger"), ("All files", "*.*"))
+    )
+    temp_root.destroy()
+
+    if not file_path:
+        print("No file selected.")
+        return transactions
+    try:
+        statement = load_file(file_path)
+    except ValueError as e:
+        print(f"\n{e}\n")
+        return transactions
+    if statement is None:
+        return transactions
+    transactions, _, _ = add_new_transactions(transactions, statement, fingerprint_set, listeners)
+    return transactions
+
+
+def choose_folder():
+    import tkinter as tk
+    from tkinter import filedialog
+
+    # Create a temporary Tk window for folder selection
+    temp_root = tk.Tk()
+    temp_root.withdraw()
+
+    folder_path = filedialog.askdirectory(title="Choose a Folder of Statement Files")
+    temp_root.destroy()
+
+    if folder_path:
+        try:
+            # Files are parsed in parallel; the totals come back already merged
+            df, cache = import_files(folder_path)
+        except ValueError as e:
+            print(f"\n{e}\n")
         else:
-            print("\nCSV file loaded successfully!")
-            run_application(df)
+            print("\nFolder loaded successfully!")
+            run_application(df, cache=cache)
     else:
-        print("No file selected.")
+        print("No folder selected.")
 
 
 def setup_gui():
+    import tkinter as tk
+
     global root
     root = tk.Tk()
     root.withdraw()  # Initially hide the main window
@@ -113,4 +324,10 @@ def setup_gui():
 
 
 if __name__ == '__main__':
+    # PFT_PROFILE=<name> records every operation and saves <name>.json/.pstats on exit
+    start_from_env()
+    if len(sys.argv) > 1:
+        # Any argument switches to the headless command-line mode
+        from cli import main
+        sys.exit(main())
     setup_gui()
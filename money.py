@@ -0,0 +1,79 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import numpy as np
+import pandas as pd
+
+# Amounts are stored as int64 numbers of cents, so every sum is exact. They are
+# converted from currency units when a file or an answer is read, and back to
+# units only to be printed, plotted or saved.
+CENTS = 100
+INT64_MIN, INT64_MAX = int(np.iinfo(np.int64).min), int(np.iinfo(np.int64).max)
+
+
+def parse_amount(value) -> int:
+    """
+    Converts an amount typed by the user (or stored as text) to cents, exactly.
+
+    :param value: e.g. "12.5", "3", 12.5
+    :return: 1250, 300, 1250
+    :raises ValueError: when the value is not a finite number
+    """
+    try:
+        cents = int((Decimal(str(value).strip()) * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError):
+        # Not a number, not finite, or too many digits to round
+        raise ValueError(f"'{value}' is not a valid amount.")
+    if not INT64_MIN < cents <= INT64_MAX:
+        raise ValueError(f"'{value}' is not a valid amount.")
+    return cents
+
+
+def to_cents(units) -> np.ndarray:
+    """
+    Converts a column of amounts in currency units (numbers or numeric text) to
+    int64 cents in one vectorized pass, with the rounding of parse_amount: half a
+    cent goes away from zero as the amount is written in decimal, so 1.005 gives
+    101 cents although the float read for it is 1.00499999999999989...
+
+    :raises ValueError: when an amount is missing, not a number, not finite or too large
+    """
+    units = pd.to_numeric(pd.Series(units) if np.ndim(units) else units)
+    units = np.asarray(units, dtype='float64')
+    scaled = np.abs(units) * CENTS
+    invalid = int((~(scaled < 2.0 ** 63)).sum())
+    if invalid:
+        # Casting NaN to int64 would silently give -9223372036854775808
+        raise ValueError(f"Amount is missing or not a valid number on {invalid:,} row{'s' if invalid != 1 else ''}.")
+    cents = np.floor(scaled + 0.5)
+    # Within float error of half a cent, the shortest decimal text of the float (the
+    # text it was read from, up to 15 significant digits) is rounded exactly instead
+    for position in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) <= scaled * 1e-12):
+        cents.flat[position] = parse_amount(repr(abs(float(units.flat[position]))))
+    return (np.sign(units) * cents).astype('int64')
+
+
+def to_units(cents):
+    """
+    Converts cents (a number, an array or a pandas object) back to currency units.
+    """
+    return cents / CENTS
+
+
+def format_amount(cents) -> str:
+    """
+    1250 -> '12.50', built from the integer so no rounding is involved.
+    """
+    cents = int(cents)
+    sign = '-' if cents < 0 else ''
+    return f"{sign}{abs(cents) // CENTS}.{abs(cents) % CENTS:02d}"
+
+
+def for_display(rows):
+    """
+    Copy of some transactions (a DataFrame or a single row) with the Amount shown in units.
+    """
+    rows = rows.copy()
+    if isinstance(rows, pd.Series):
+        rows['Amount'] = format_amount(rows['Amount'])
+    else:
+        rows['Amount'] = [format_amount(cents) for cents in rows['Amount']]
+    return rows
@@ -0,0 +1,98 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from aggregate_cache import AggregateCache
+from columnar_store import LEDGER_SUFFIX, read_ledger
+from data_analysis import aggregate_file
+from data_loader import concat_transactions, load_transactions, read_header, required_fields
+from fingerprints import FingerprintSet, fingerprints
+from profiling import profiled
+
+
+def find_files(source) -> list:
+    """
+    Lists the statement files to import.
+
+    :param source: a directory (every .csv and .ledger file in it) or a glob pattern
+    :return: sorted list of file paths
+    """
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, '*.csv')) + glob.glob(os.path.join(source, f'*{LEDGER_SUFFIX}'))
+    else:
+        paths = glob.glob(source)
+    return sorted(paths)
+
+
+def _import_file(path, load):
+    """
+    Runs in a worker process: computes the totals of one file and, when asked, its
+    transactions and their fingerprints.
+    """
+    if path.endswith(LEDGER_SUFFIX):
+        transactions = read_ledger(path) if load else None
+    elif not required_fields.issubset(read_header(path)):
+        raise ValueError(f"The required fields do not match {path}.")
+    else:
+        transactions = load_transactions(path, report=False) if load else None
+
+    if transactions is None:
+        # Only the totals are needed, so the file is streamed instead of loaded
+        return aggregate_file(path), None, None
+    return AggregateCache.from_transactions(transactions), transactions, fingerprints(transactions)
+
+
+@profiled
+def import_files(source, workers=None, build_ledger=True, report=True, deduplicate=True):
+    """
+    Imports many statement files at once, parsing them in a pool of processes.
+    Each worker computes the category and monthly totals of its file; the parent
+    only merges those partial totals and, optionally, the sorted transactions.
+
+    Statements usually overlap, so with `deduplicate` a row already imported from an
+    earlier file is dropped (identical rows within one file are all kept). This needs
+    the transactions of every file, so only with `build_ledger` and `deduplicate` both
+    unset are the files streamed for their totals instead of loaded.
+
+    :param source: a directory or a glob pattern (see find_files), or a list of file paths
+    :param workers: number of processes (all the CPUs by default)
+    :param build_ledger: also return the combined transactions sorted by date
+    :param report: print how many files were imported
+    :param deduplicate: drop the rows of overlapping statements that were already imported
+    :return: (combined pandas dataframe or None, AggregateCache with the combined totals)
+    """
+    paths = find_files(source) if isinstance(source, str) else sorted(source)
+    if not paths:
+        raise ValueError("No CSV or ledger files found.")
+
+    cache = AggregateCache()
+    frames = []
+    seen = FingerprintSet()
+    duplicates = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map keeps the file order, so the combined ledger is the same on every run
+        load = build_ledger or deduplicate
+        for file_cache, transactions, file_fingerprints in executor.map(_import_file, paths, [load] * len(paths)):
+            cache.merge(file_cache)
+            if transactions is None:
+                continue
+            if deduplicate:
+                unseen = ~seen.contains(file_fingerprints)
+                if not unseen.all():
+                    # The totals of the file included the dropped rows
+                    cache.on_delete(transactions[~unseen])
+                    duplicates += int((~unseen).sum())
+                    transactions = transactions[unseen]
+                seen.update(file_fingerprints[unseen])
+            if build_ledger:
+                frames.append(transactions)
+
+    if report:
+        print(f"\n{len(paths)} files imported.")
+        if duplicates:
+            print(f"{duplicates} transactions found in more than one file were imported once.")
+    if not build_ledger:
+        return None, cache
+
+    combined = concat_transactions(frames)
+    combined.sort_values(by='Date', kind='stable', inplace=True, ignore_index=True)
+    return combined, cache
@@ -0,0 +1,74 @@
+import pandas as pd
+from datetime import datetime
+from date_index import date_bounds
+from money import for_display
+
+# Rows printed per screen
+PAGE_SIZE = 20
+
+
+def render_page(transactions: pd.DataFrame, start: int, page_size=PAGE_SIZE, hidden=()) -> str:
+    """
+    Formats only the rows of one page, so the cost does not depend on the ledger size.
+
+    :param transactions: the pandas dataframe to display
+    :param start: position of the first row of the page
+    :param page_size: number of rows per page
+    :param hidden: IDs of deleted rows still waiting to be compacted, left out of the page
+    :return: the page as text, followed by its position in the ledger
+    """
+    total = len(transactions)
+    end = min(start + page_size, total)
+    page = transactions.iloc[start:end]
+    if hidden:
+        page = page[~page.index.isin(list(hidden))]
+    return f"{for_display(page).to_string()}\n\nRows {start}-{max(end - 1, start)} of {total}"
+
+
+def browse_transactions(transactions: pd.DataFrame, start=0, page_size=PAGE_SIZE, hidden=()):
+    """
+    Paged viewer. Enter shows the next page, 'p' the previous one, 'g <index>' jumps
+    to a row, 'd <YYYY-MM-DD>' to the first transaction on or after a date and 'q'
+    leaves the viewer. A ledger that fits in one page is simply printed.
+    """
+    total = len(transactions)
+    if total <= page_size:
+        print(for_display(transactions[~transactions.index.isin(list(hidden))] if hidden else transactions))
+        return
+
+    start = max(0, min(start, total - 1))
+    while True:
+        print(f"\n{render_page(transactions, start, page_size, hidden)}")
+        command = input("\n[Enter] next, [p] previous, [g INDEX] go to row, [d YYYY-MM-DD] go to date, [q] done: ").strip().lower()
+
+        if command == "q":
+            return
+        elif command == "":
+            if start + page_size < total:
+                start += page_size
+            else:
+                print("\nThis is the last page.")
+        elif command == "p":
+            start = max(0, start - page_size)
+        elif command.startswith("g"):
+            try:
+                index = int(command[1:].strip())
+            except ValueError:
+                print("\nThe index must be a number. Please try again.")
+                continue
+            # INDEX is the label printed on the left, which is not always the position
+            position = transactions.index.get_indexer([index])[0]
+            if position < 0:
+                print("\nInvalid index. Please choose a valid transaction.")
+                continue
+            start = position
+        elif command.startswith("d"):
+            try:
+                date = datetime.strptime(command[1:].strip(), "%Y-%m-%d")
+            except ValueError:
+                print("\nInvalid date format. Please use YYYY-MM-DD.")
+                continue
+            # Binary search on the sorted dates, the first row on or after that day
+            start = min(date_bounds(transactions, date, date)[0], total - 1)
+        else:
+            print("\nInvalid command. Please try again.")
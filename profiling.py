@@ -0,0 +1,192 @@
+import atexit
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import pstats
+import time
+import tracemalloc
+import pandas as pd
+
+# Setting this variable turns profiling on at startup and saves the results on exit:
+#   PFT_PROFILE=slow_day python main.py  ->  slow_day.json and slow_day.pstats
+PROFILE_ENV = 'PFT_PROFILE'
+DEFAULT_PREFIX = 'profile'
+
+
+class Profiler:
+    """
+    Records wall time, CPU time, rows touched and peak allocations of every
+    instrumented operation, and runs cProfile for the function-level detail.
+
+    While disabled, an instrumented call costs one attribute check. Operations can
+    nest (an analysis called from a menu action); each one reports its own peak.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self._stack = []
+        self._profile = None
+
+    def start(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        tracemalloc.start()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self._profile.disable()
+        tracemalloc.stop()
+        self.enabled = False
+
+    def clear(self):
+        self.records.clear()
+        if self._profile is not None:
+            self._profile = cProfile.Profile()
+            if self.enabled:
+                self._profile.enable()
+
+    @contextlib.contextmanager
+    def operation(self, name: str, rows=None):
+        """
+        Measures the body of the with statement as one operation.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        if self._stack:
+            # The parent's peak so far must survive the reset below
+            parent = self._stack[-1]
+            parent['peak'] = max(parent['peak'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        frame = {'start': current, 'peak': current}
+        self._stack.append(frame)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self._stack.pop()
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1]) if tracemalloc.is_tracing() else frame['peak']
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            self.records.append({
+                'operation': name,
+                'wall_s': wall,
+                'cpu_s': cpu,
+                'rows': rows,
+                'peak_alloc_bytes': peak - frame['start'],
+                'depth': len(self._stack),
+            })
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Totals per operation, slowest first.
+        """
+        if not self.records:
+            return pd.DataFrame(columns=['calls', 'wall_s', 'cpu_s', 'rows', 'peak_alloc_bytes'])
+        records = pd.DataFrame(self.records)
+        summary = records.groupby('operation').agg(calls=('wall_s', 'size'), wall_s=('wall_s', 'sum'),
+                                                   cpu_s=('cpu_s', 'sum'), rows=('rows', 'max'),
+                                                   peak_alloc_bytes=('peak_alloc_bytes', 'max'))
+        return summary.sort_values('wall_s', ascending=False)
+
+    def dump(self, prefix=DEFAULT_PREFIX):
+        """
+        Saves the operations to <prefix>.json and the cProfile data to <prefix>.pstats.
+
+        :return: the paths written
+        """
+        summary = self.summary()
+        with open(f"{prefix}.json", 'w') as handle:
+            json.dump({'operations': self.records,
+                       'summary': summary.reset_index().to_dict(orient='records')},
+                      handle, indent=2, default=float)
+        paths = [f"{prefix}.json"]
+        if self._profile is not None:
+            self._profile.create_stats()
+            if self._profile.stats:
+                pstats.Stats(self._profile).dump_stats(f"{prefix}.pstats")
+                paths.append(f"{prefix}.pstats")
+            if self.enabled:
+                self._profile.enable()  # create_stats() stops the profiler
+        return paths
+
+
+profiler = Profiler()
+
+
+def _rows(args):
+    # Rows touched: the size of the first DataFrame the operation received
+    for arg in args:
+        if isinstance(arg, pd.DataFrame):
+            return len(arg)
+    return None
+
+
+def profiled(function):
+    """
+    Decorator that records every call of `function` as an operation.
+    """
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return function(*args, **kwargs)
+        with profiler.operation(name, _rows(args)):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def start_from_env():
+    """
+    Starts profiling when PFT_PROFILE is set, and saves the results at exit.
+    """
+    prefix = os.environ.get(PROFILE_ENV, '').strip()
+    if not prefix or profiler.enabled:
+        return
+    if prefix.lower() in ('1', 'true', 'yes'):
+        prefix = DEFAULT_PREFIX
+    profiler.start()
+    atexit.register(profiler.dump, prefix)
+
+
+def show_metrics():
+    """
+    Menu option: prints the recorded operations and lets the user turn profiling
+    on or off and save the results.
+    """
+    summary = profiler.summary()
+    if summary.empty:
+        print("\nNo operations recorded yet." if profiler.enabled else "\nProfiling is off.")
+    else:
+        print("\nOperations (seconds, bytes):\n")
+        print(summary.to_string(float_format=lambda value: f"{value:,.4f}"))
+
+    state = "on" if profiler.enabled else "off"
+    action = input(f"\n[O] turn profiling {'off' if profiler.enabled else 'on'} (now {state}), "
+                   "[S] save to files, [R] reset, [Enter] back: ").strip().capitalize()
+
+    if action == "O":
+        if profiler.enabled:
+            profiler.stop()
+            print("\nProfiling is off.")
+        else:
+            profiler.start()
+            print("\nProfiling is on. Use the menu, then come back here to see the results.")
+    elif action == "S":
+        prefix = input(f"File name prefix (default '{DEFAULT_PREFIX}'): ").strip() or DEFAULT_PREFIX
+        paths = profiler.dump(prefix)
+        print(f"\nSaved {', '.join(paths)}")
+    elif action == "R":
+        profiler.clear()
+        print("\nRecorded operations cleared.")
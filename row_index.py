@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+from profiling import profiled
+
+# Every transaction is identified by the label of its row (its ID). IDs are given once,
+# never change when the ledger is sorted or rows are inserted, and are looked up
+# through the hash table pandas keeps for the index, so finding a row by ID is O(1).
+
+# Highest ID handed out in this process, so the ID of a deleted row is never reused
+_last_id = -1
+
+# Tombstones are dropped once they exceed this fraction of the ledger
+COMPACT_RATIO = 0.25
+
+
+def new_ids(transactions: pd.DataFrame, count: int) -> np.ndarray:
+    """
+    Returns `count` fresh IDs, higher than any ID already used.
+    """
+    global _last_id
+    highest = transactions.index.max() if len(transactions) else -1
+    first = max(_last_id, highest) + 1
+    _last_id = first + count - 1
+    return np.arange(first, first + count)
+
+
+class RowIndex:
+    """
+    Tombstones for deleted transactions. Deleting marks the ID instead of removing
+    the row, which would copy the whole ledger; the marked rows are dropped together
+    by compact(), which the menu runs before any option that reads the whole ledger.
+    """
+
+    def __init__(self):
+        self.deleted = set()
+
+    def __len__(self):
+        return len(self.deleted)
+
+    def is_live(self, transactions: pd.DataFrame, transaction_id) -> bool:
+        return transaction_id in transactions.index and transaction_id not in self.deleted
+
+    def delete(self, transaction_id):
+        self.deleted.add(transaction_id)
+
+    def needs_compaction(self, transactions: pd.DataFrame) -> bool:
+        return len(self.deleted) > COMPACT_RATIO * len(transactions)
+
+    @profiled
+    def compact(self, transactions: pd.DataFrame) -> pd.DataFrame:
+        """
+        Drops every tombstoned row in a single pass. The remaining IDs do not change.
+        """
+        if not self.deleted:
+            return transactions
+        compacted = transactions.drop(index=list(self.deleted))
+        self.deleted.clear()
+        return compacted
@@ -0,0 +1,322 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from data_loader import TRANSACTION_COLUMNS, CATEGORICAL_COLUMNS, DEFAULT_CHUNK_SIZE, empty_transactions
+from fingerprints import FingerprintSet
+from profiling import profiled
+
+# Ledgers with this extension live in an SQLite database instead of a file that is
+# rewritten on save. Every add, edit and delete is a single indexed statement, and
+# the range filters and totals run inside SQLite, so a process can query a ledger
+# of any size without loading it. WAL mode lets several processes read while one writes.
+SQLITE_SUFFIX = '.db'
+
+# Dates are stored as YYYY-MM-DD text, which sorts like the dates themselves;
+# amounts as integer cents. The fingerprints of the rows (see fingerprints.py) are
+# saved as one sorted uint64 array, stamped with the version of the database they
+# were computed for: PRAGMA user_version, increased by every write of the store
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT,
+    amount INTEGER NOT NULL,
+    type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category, date);
+CREATE INDEX IF NOT EXISTS transactions_type ON transactions (type, date);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    version INTEGER NOT NULL,
+    known BLOB NOT NULL
+);
+"""
+
+SQL_COLUMNS = {'Date': 'date', 'Category': 'category', 'Description': 'description', 'Amount': 'amount', 'Type': 'type'}
+
+# The id column holds the transaction IDs (the dataframe index), so edits and
+# deletes find their row through the primary key
+_INSERT = "INSERT INTO transactions (id, date, category, description, amount, type) VALUES (?, ?, ?, ?, ?, ?)"
+
+# Period rollups: SQL groups by month, coarser periods are summed from the months
+ROLLUPS = {'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+
+def _records(rows: pd.DataFrame) -> list:
+    """
+    The rows as (id, date, category, description, amount, type) tuples for the SQL parameters.
+    """
+    dates = pd.to_datetime(rows['Date']).dt.strftime('%Y-%m-%d')
+    descriptions = rows['Description'].astype(object).where(rows['Description'].notna(), None)
+    return list(zip(rows.index.astype('int64').tolist(), dates.tolist(), rows['Category'].astype(str).tolist(),
+                    descriptions.tolist(), rows['Amount'].astype('int64').tolist(), rows['Type'].astype(str).tolist()))
+
+
+def _frame(records: list, columns: list) -> pd.DataFrame:
+    """
+    Rows fetched from SQLite as (id, *columns), typed like load_transactions and
+    indexed by their ID.
+    """
+    if not records:
+        return empty_transactions()[columns]
+    frame = pd.DataFrame.from_records(records, columns=['id', *columns], index='id').rename_axis(None)
+    if 'Date' in columns:
+        frame['Date'] = pd.to_datetime(frame['Date'], format='%Y-%m-%d')
+    if 'Amount' in columns:
+        frame['Amount'] = frame['Amount'].astype('int64')
+    for column in CATEGORICAL_COLUMNS:
+        if column in columns:
+            frame[column] = frame[column].astype('category')
+    return frame
+
+
+def _filters(start=None, end=None, category=None, kind=None):
+    # WHERE clause and parameters; every condition can use one of the indexes
+    conditions, parameters = [], []
+    if start is not None:
+        conditions.append("date >= ?")
+        parameters.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+    if end is not None:
+        conditions.append("date <= ?")
+        parameters.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+    if category is not None:
+        conditions.append("category = ?")
+        parameters.append(category)
+    if kind is not None:
+        conditions.append("type = ?")
+        parameters.append(kind)
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), parameters
+
+
+class SqliteStore:
+    """
+    Transactions kept in an SQLite database.
+
+    The store listens to add, edit and delete like the Journal, writing each change
+    as it happens. It also answers the same questions as the AggregateCache
+    (category_totals, expense_totals, monthly_totals) and the SpendingCube (total,
+    rollup) with GROUP BY queries, so it can be passed wherever those are.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def version(self) -> int:
+        """
+        Number of writes made to the database by the store.
+        """
+        return self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def _changed(self):
+        # Runs inside each write transaction, after its first statement took the write lock
+        self.connection.execute(f"PRAGMA user_version = {self.version() + 1}")
+
+    def next_id(self) -> int:
+        """
+        The ID following the highest one in the database, from the primary key.
+        """
+        return self.connection.execute("SELECT COALESCE(MAX(id), -1) + 1 FROM transactions").fetchone()[0]
+
+    def load_fingerprints(self):
+        """
+        The FingerprintSet saved in the database, or one built from its transactions
+        when none was saved for this version of it.
+
+        :return: (fingerprint set, version of the database it belongs to)
+        """
+        version = self.version()
+        saved = self.connection.execute("SELECT known FROM fingerprints WHERE version = ?", (version,)).fetchone()
+        if saved is None:
+            return FingerprintSet.from_transactions(self.read()), version
+        fingerprint_set = FingerprintSet()
+        fingerprint_set.known = np.frombuffer(saved[0], dtype=np.uint64)
+        return fingerprint_set, version
+
+    def save_fingerprints(self, fingerprint_set, version: int):
+        """
+        Saves the fingerprints of the transactions as they are at `version`. Nothing is
+        saved when the database has been written since, the set would not match it.
+        """
+        fingerprint_set.flush()
+        with self.connection:
+            self.connection.execute("DELETE FROM fingerprints")
+            if self.version() == version:
+                self.connection.execute("INSERT INTO fingerprints (version, known) VALUES (?, ?)",
+                                        (version, fingerprint_set.known.tobytes()))
+
+    @profiled
+    def write(self, transactions: pd.DataFrame, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Replaces the whole content of the database with the transactions, in one transaction.
+        Their IDs are kept.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM transactions")
+            self._changed()
+            for start in range(0, len(transactions), chunk_size):
+                self.connection.executemany(_INSERT, _records(transactions.iloc[start:start + chunk_size]))
+
+    def _query(self, where="", parameters=(), columns=None) -> pd.DataFrame:
+        columns = TRANSACTION_COLUMNS if columns is None else [c for c in TRANSACTION_COLUMNS if c in columns]
+        select = ", ".join(SQL_COLUMNS[column] for column in columns)
+        cursor = self.connection.execute(f"SELECT id, {select} FROM transactions{where} ORDER BY date, id",
+                                         parameters)
+        return _frame(cursor.fetchall(), columns)
+
+    @profiled
+    def read(self, columns=None) -> pd.DataFrame:
+        """
+        Loads every transaction, sorted by date, with the schema of load_transactions and
+        the IDs stored in the database.
+        """
+        return self._query(columns=columns)
+
+    def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+        """
+        Streams the transactions in date order, chunk_size rows at a time.
+        """
+        columns = TRANSACTION_COLUMNS if columns is None else [c for c in TRANSACTION_COLUMNS if c in columns]
+        select = ", ".join(SQL_COLUMNS[column] for column in columns)
+        cursor = self.connection.execute(f"SELECT id, {select} FROM transactions ORDER BY date, id")
+        while True:
+            records = cursor.fetchmany(chunk_size)
+            if not records:
+                return
+            yield _frame(records, columns)
+
+    @profiled
+    def transactions_between(self, start, end, category=None, kind=None) -> pd.DataFrame:
+        """
+        The rows dated between start and end (inclusive), read through the date index.
+        Only the matching rows are loaded.
+        """
+        where, parameters = _filters(start, end, category, kind)
+        return self._query(where, parameters)
+
+    def date_bounds(self):
+        """
+        First and last date in the database (None when it is empty), from the date index.
+        """
+        first, last = self.connection.execute("SELECT MIN(date), MAX(date) FROM transactions").fetchone()
+        return (None, None) if first is None else (pd.Timestamp(first), pd.Timestamp(last))
+
+    def on_add(self, rows: pd.DataFrame):
+        if rows.empty:
+            return
+        with self.connection:
+            self.connection.executemany(_INSERT, _records(rows))
+            self._changed()
+
+    def on_delete(self, rows: pd.DataFrame):
+        if rows.empty:
+            return
+        with self.connection:
+            self.connection.executemany("DELETE FROM transactions WHERE id = ?",
+                                        [(i,) for i in rows.index.astype('int64').tolist()])
+            self._changed()
+
+    def on_edit(self, old_rows: pd.DataFrame, new_rows: pd.DataFrame):
+        if old_rows.empty:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE transactions SET date = ?, category = ?, description = ?, amount = ?, type = ? WHERE id = ?",
+                [new[1:] + old[:1] for old, new in zip(_records(old_rows), _records(new_rows))])
+            self._changed()
+
+    def _totals(self, key: str, name: str, where="", parameters=(), order="") -> pd.Series:
+        cursor = self.connection.execute(
+            f"SELECT {key}, SUM(amount) FROM transactions{where} GROUP BY 1{order}", parameters)
+        records = cursor.fetchall()
+        return pd.Series([total for _, total in records], index=pd.Index([key for key, _ in records], name=name),
+                         dtype='int64', name='Amount')
+
+    @profiled
+    def category_totals(self) -> pd.Series:
+        """
+        Total amount in cents per category (all types), highest first.
+        """
+        return self._totals("category", 'Category', order=" ORDER BY 2 DESC")
+
+    @profiled
+    def expense_totals(self) -> pd.Series:
+        """
+        Total expense in cents per category, ordered by category name.
+        """
+        return self._totals("category", 'Category', " WHERE type = 'Expense'", order=" ORDER BY 1")
+
+    @profiled
+    def monthly_totals(self) -> pd.DataFrame:
+        """
+        DataFrame with a row per month (same layout as AggregateCache.monthly_totals, in cents).
+        """
+        monthly = self._totals("substr(date, 1, 7)", 'Date', order=" ORDER BY 1").reset_index()
+        monthly['Date'] = pd.to_datetime(monthly['Date'], format='%Y-%m')
+        return monthly[['Amount', 'Date']]
+
+    def total(self, start, end, category=None, kind='Expense') -> int:
+        """
+        Total amount in cents between two dates (inclusive), like SpendingCube.total.
+        """
+        where, parameters = _filters(start, end, category, kind)
+        total = self.connection.execute(f"SELECT SUM(amount) FROM transactions{where}", parameters).fetchone()[0]
+        return int(total or 0)
+
+    def rollup(self, period='month', category=None, kind='Expense', start=None, end=None) -> pd.Series:
+        """
+        Totals in cents per month, quarter or year, like SpendingCube.rollup.
+        """
+        if start is None or end is None:
+            first, last = self.date_bounds()
+            if first is None:
+                return pd.Series(dtype='int64', name='Amount')
+            start, end = first if start is None else start, last if end is None else end
+        where, parameters = _filters(start, end, category, kind)
+        months = self._totals("substr(date, 1, 7)", 'Date', where, parameters)
+        periods = pd.period_range(pd.Timestamp(start), pd.Timestamp(end), freq=ROLLUPS[period])
+        totals = months.groupby(pd.PeriodIndex(months.index, freq='M').asfreq(ROLLUPS[period])).sum()
+        values = totals.reindex(periods, fill_value=0).to_numpy(dtype=np.int64)
+        return pd.Series(values, index=periods.start_time.rename('Date'), name='Amount')
+
+
+def read_database(path) -> pd.DataFrame:
+    """
+    Loads a whole database file, like read_ledger.
+    """
+    store = SqliteStore(path)
+    try:
+        return store.read()
+    finally:
+        store.close()
+
+
+def write_database(transactions: pd.DataFrame, path):
+    """
+    Saves the transactions as a database file, replacing what it held.
+    """
+    store = SqliteStore(path)
+    try:
+        store.write(transactions)
+    finally:
+        store.close()
+
+
+def iter_database_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+    """
+    Streams a database file in chunks of at most chunk_size rows.
+    """
+    store = SqliteStore(path)
+    try:
+        yield from store.iter_chunks(chunk_size, columns)
+    finally:
+        store.close()
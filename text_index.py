@@ -0,0 +1,205 @@
+import bisect
+import re
+import numpy as np
+import pandas as pd
+from date_index import date_bounds
+from profiling import profiled
+
+# Columns whose words are indexed
+INDEXED_COLUMNS = ['Description', 'Category']
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text) -> list:
+    """
+    Lower-case words of a text: "Uber *Trip, 2 rides" -> ['uber', 'trip', '2', 'rides']
+    """
+    return _WORD.findall(str(text).lower())
+
+
+def _merge(parts) -> np.ndarray:
+    # Sorted, distinct union of ID arrays; the parts are sorted runs, which a stable sort merges quickly
+    if not parts:
+        return np.empty(0, dtype=np.int64)
+    ids = np.sort(np.concatenate(parts), kind='stable')
+    if len(ids):
+        ids = ids[np.concatenate(([True], ids[1:] != ids[:-1]))]
+    return ids
+
+
+def _intersect(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Binary-searches the smaller sorted array in the larger one: O(small log large)
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a) or not len(b):
+        return a[:0]
+    found = b[np.minimum(np.searchsorted(b, a), len(b) - 1)] == a
+    return a[found]
+
+
+class TextIndex:
+    """
+    Inverted index from the words of Description and Category to transaction IDs.
+
+    It has two levels: a word maps to the distinct texts that contain it, and a text
+    maps to the IDs of its rows. A ledger repeats the same few thousand texts, so the
+    words are extracted once per distinct text, not once per row, and answering a
+    word touches only the IDs it returns. The IDs found at build time live in one
+    array, sorted by text and then by ID; later changes go into small per-text sets,
+    like the pending changes of the FingerprintSet.
+    """
+
+    def __init__(self):
+        self.texts = {}  # (column, text) -> text code
+        self.columns = []  # text code -> column
+        self.words = {}  # word -> set of text codes
+        self._sorted_words = []
+        self._ids = np.empty(0, dtype=np.int64)
+        self._starts = np.empty(0, dtype=np.int64)
+        self._ends = np.empty(0, dtype=np.int64)
+        self.added = {}  # text code -> set of IDs
+        self.removed = {}  # text code -> set of IDs
+
+    def _code(self, column, text, keep_sorted=True) -> int:
+        # Registers a new text and its words. A build sorts all the words once at the
+        # end instead, as inserting each one in order would cost O(words²)
+        key = (column, text)
+        code = self.texts.get(key)
+        if code is None:
+            code = self.texts[key] = len(self.texts)
+            self.columns.append(column)
+            for word in set(tokenize(text)):
+                if word not in self.words:
+                    self.words[word] = set()
+                    if keep_sorted:
+                        bisect.insort(self._sorted_words, word)
+                self.words[word].add(code)
+        return code
+
+    @classmethod
+    @profiled
+    def from_transactions(cls, transactions: pd.DataFrame):
+        index = cls()
+        ids = transactions.index.to_numpy(dtype=np.int64)
+        all_codes = []
+        for column in INDEXED_COLUMNS:
+            codes, uniques = pd.factorize(transactions[column])
+            mapping = np.array([index._code(column, text, keep_sorted=False) for text in uniques], dtype=np.int64)
+            all_codes.append(np.where(codes >= 0, mapping[codes] if len(mapping) else -1, -1))
+        index._sorted_words = sorted(index.words)
+        codes = np.concatenate(all_codes)
+        row_ids = np.tile(ids, len(INDEXED_COLUMNS))
+        keep = codes >= 0
+        codes, row_ids = codes[keep], row_ids[keep]
+        order = np.lexsort((row_ids, codes))
+        index._ids = row_ids[order]
+        counts = np.bincount(codes, minlength=len(index.texts))
+        index._ends = np.cumsum(counts)
+        index._starts = index._ends - counts
+        return index
+
+    def _changes(self, rows: pd.DataFrame):
+        # (text code, ID) of every indexed cell of the rows
+        for column in INDEXED_COLUMNS:
+            for transaction_id, text in zip(rows.index, rows[column]):
+                if not pd.isna(text):
+                    yield self._code(column, text), transaction_id
+
+    def on_add(self, rows: pd.DataFrame):
+        for code, transaction_id in self._changes(rows):
+            if transaction_id in self.removed.get(code, ()):
+                self.removed[code].discard(transaction_id)
+            else:
+                self.added.setdefault(code, set()).add(transaction_id)
+
+    def on_delete(self, rows: pd.DataFrame):
+        for code, transaction_id in self._changes(rows):
+            if transaction_id in self.added.get(code, ()):
+                self.added[code].discard(transaction_id)
+            else:
+                self.removed.setdefault(code, set()).add(transaction_id)
+
+    def on_edit(self, old_rows: pd.DataFrame, new_rows: pd.DataFrame):
+        self.on_delete(old_rows)
+        self.on_add(new_rows)
+
+    def _text_ids(self, code: int) -> np.ndarray:
+        # Sorted IDs of the rows holding one text
+        ids = self._ids[self._starts[code]:self._ends[code]] if code < len(self._starts) else self._ids[:0]
+        if self.removed.get(code):
+            ids = ids[~np.isin(ids, list(self.removed[code]))]
+        if self.added.get(code):
+            ids = _merge([ids, np.fromiter(self.added[code], np.int64, len(self.added[code]))])
+        return ids
+
+    def _matching_words(self, word: str, prefix: bool) -> list:
+        if not prefix:
+            return [word] if word in self.words else []
+        lo = bisect.bisect_left(self._sorted_words, word)
+        hi = bisect.bisect_left(self._sorted_words, word + '\U0010ffff')
+        return self._sorted_words[lo:hi]
+
+    def _text_codes(self, word: str, prefix=False) -> set:
+        codes = set()
+        for match in self._matching_words(word.lower(), prefix):
+            codes |= self.words[match]
+        return codes
+
+    def lookup(self, word: str, prefix=False) -> np.ndarray:
+        """
+        Sorted IDs of the transactions with the word (or a word starting with it).
+        """
+        return _merge([self._text_ids(code) for code in self._text_codes(word, prefix)])
+
+    @profiled
+    def search(self, query: str, match_all=True) -> np.ndarray:
+        """
+        IDs of the transactions matching a query, in the Description or the Category.
+        Words ending in '*' are prefixes: "taxi", "amaz*", "coffee starb*".
+
+        :param query: one or more words
+        :param match_all: True to require every word, False for any of them
+        :return: sorted numpy array of IDs
+        """
+        terms = []
+        for term in query.split():
+            words = tokenize(term)
+            terms += [self._text_codes(word, term.endswith('*') and position == len(words) - 1)
+                      for position, word in enumerate(words)]
+        if not terms:
+            return np.empty(0, dtype=np.int64)
+
+        if not match_all:
+            return _merge([self._text_ids(code) for code in set().union(*terms)])
+        columns = {self.columns[code] for codes in terms for code in codes}
+        if len(columns) == 1:
+            # Every word is in the same column, where a row has a single text: the texts
+            # holding all the words are intersected, and their rows never need to be
+            return _merge([self._text_ids(code) for code in set.intersection(*terms)])
+        result = None
+        for codes in terms:
+            ids = _merge([self._text_ids(code) for code in codes])
+            result = ids if result is None else _intersect(result, ids)
+        return result
+
+    def select(self, transactions: pd.DataFrame, query: str, start=None, end=None, match_all=True) -> pd.DataFrame:
+        """
+        The matching transactions, in date order, optionally within a date range.
+        Costs O(matches): the IDs are looked up in the index of the dataframe and the
+        range is a binary search on the dates, so no other row is read.
+
+        :param transactions: pandas dataframe sorted by 'Date'
+        :param query: see search()
+        :param start: first date of the range
+        :param end: last date of the range
+        :return: the matching rows, ready for spending_by_category or monthly_spending
+        """
+        positions = transactions.index.get_indexer(self.search(query, match_all))
+        positions = positions[positions >= 0]
+        if len(transactions) and (start is not None or end is not None):
+            lo, hi = date_bounds(transactions,
+                                 start if start is not None else transactions['Date'].iloc[0],
+                                 end if end is not None else transactions['Date'].iloc[-1])
+            positions = positions[(positions >= lo) & (positions < hi)]
+        return transactions.iloc[np.sort(positions)]
@@ -1,10 +1,11 @@
-def validate_index(i, dataframe):
+def validate_index(i, dataframe, deleted=()):
     try:
         idx = int(i)
     except ValueError:
         raise ValueError("The index must be an integer. Please, try again!")
-    if idx < 0 or idx >= len(dataframe):
-        raise ValueError("Position not found, please, try again!")
+    # The index holds the transaction IDs, so this is a hash lookup, not a scan
+    if idx not in dataframe.index or idx in deleted:
+        raise ValueError("Transaction not found, please, try again!")
     return idx
 
 
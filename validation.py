@@ -0,0 +1,373 @@
+import collections
+import csv
+import io
+import os
+import time
+import numpy as np
+import pandas as pd
+from data_loader import (TRANSACTION_COLUMNS, CATEGORICAL_COLUMNS, DEFAULT_CHUNK_SIZE, required_fields,
+                         concat_transactions, report_load)
+from profiling import profiled
+from money import CENTS, to_cents
+
+# The rules enforced one field at a time by add_transaction, applied here to whole
+# columns at once. Text rules run once per distinct value, not once per row.
+QUARANTINE_SUFFIX = '.quarantine.csv'
+ERROR_COLUMNS = ['line', 'column', 'value', 'error']
+REJECTED_COLUMNS = ['Line', *TRANSACTION_COLUMNS, 'Error']
+
+# A quoted field may hold line breaks; a quote still open after this many lines is
+# reported as unterminated, and the lines after it are read again as records
+MAX_RECORD_LINES = 20
+
+# Largest block of the file read and split into records at once
+BLOCK_BYTES = 1 << 24
+
+
+def _distinct(values: pd.Series):
+    # (codes, distinct values); missing values get code -1
+    return pd.factorize(values, use_na_sentinel=True)
+
+
+def _passes(distinct, test) -> np.ndarray:
+    """
+    Boolean mask of the values passing `test`, calling it once per distinct value.
+    Missing values fail.
+    """
+    codes, uniques = distinct
+    passed = np.fromiter((test(str(value)) for value in uniques), dtype=bool, count=len(uniques))
+    return np.where(codes >= 0, passed[codes] if len(passed) else False, False)
+
+
+def _parse(distinct, parser, index) -> pd.Series:
+    # Parses each distinct value once, then spreads the results back over the rows
+    codes, uniques = distinct
+    parsed = parser(pd.Series(uniques))
+    return parsed.take(codes).where(codes >= 0).set_axis(index) if len(parsed) else \
+        parser(pd.Series(np.full(len(codes), None), index=index))
+
+
+def _check(rows: pd.DataFrame, today):
+    """
+    Parses the Date and Amount columns and lists the failed rules.
+
+    :return: (dates, amounts in cents, list of (column, boolean mask of failing rows, message))
+    """
+    dates = _parse(_distinct(rows['Date']), lambda values: pd.to_datetime(values, format='ISO8601', errors='coerce'),
+                   rows.index)
+    amounts = _parse(_distinct(rows['Amount']), lambda values: pd.to_numeric(values, errors='coerce'), rows.index)
+    # Amounts are judged in cents, as they will be stored: 0.004 rounds to nothing
+    valid = (amounts.abs() * CENTS < 2.0 ** 63).to_numpy()
+    cents = to_cents(amounts.where(valid, 0))
+    category, description = _distinct(rows['Category']), _distinct(rows['Description'])
+    failures = [
+        ('Date', dates.isna().to_numpy(), "Invalid date format. Please use YYYY-MM-DD."),
+        ('Date', (dates.dt.normalize() > today).to_numpy(), "Invalid date. Transactions cannot be in the future."),
+        ('Category', ~_passes(category, lambda value: value.strip() != ""), "Category cannot be empty."),
+        ('Category', ~_passes(category, lambda value: value.strip() == "" or value.replace(" ", "").isalpha()),
+         "Please use only alphabetic characters for the category."),
+        ('Description', ~_passes(description, lambda value: value.strip() != ""), "Description cannot be empty."),
+        ('Description', _passes(description, lambda value: value.strip().isnumeric()),
+         "Description cannot be purely numeric."),
+        ('Amount', ~valid, "Please enter a valid number."),
+        ('Amount', valid & (cents <= 0), "Amount must be greater than zero."),
+        ('Type', ~_passes(_distinct(rows['Type']), lambda value: value in ("Expense", "Income")),
+         "Type must be either 'Expense' or 'Income'."),
+    ]
+    return dates, cents, failures
+
+
+def _field_count(lines: list):
+    """
+    Number of fields of a record made of one or more physical lines.
+
+    :return: the count, None while a quoted field is still open, or -1 when the quotes are malformed
+    """
+    if len(lines) == 1 and '"' not in lines[0]:
+        return lines[0].count(',') + 1
+    try:
+        records = list(csv.reader(lines, strict=True))
+    except csv.Error as e:
+        return None if 'unexpected end of data' in str(e) else -1
+    return len(records[0]) if len(records) == 1 else -1
+
+
+def _read_blocks(handle, chunk_size: int):
+    """
+    Reads a binary file in blocks of whole lines, of at most chunk_size lines each.
+
+    :return: generator of (block, whether it ends the file)
+    """
+    size = max(1, min(BLOCK_BYTES, chunk_size * 256))
+    rest = b''
+    while True:
+        block = rest
+        if block.count(b'\n') < chunk_size:
+            block += handle.read(size)
+            block += handle.readline()
+        breaks = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+        if len(breaks) > chunk_size:
+            cut = breaks[chunk_size - 1] + 1
+            block, rest = block[:cut], block[cut:]
+        else:
+            rest = b''
+        if not block:
+            return
+        yield block, not rest and not handle.peek(1)
+
+
+def _split_block(block: bytes, first: int, width: int):
+    """
+    Finds the records of a block of lines and checks their number of fields without
+    a Python loop: commas are counted per line, leaving out those inside quotes.
+
+    :param first: line number of the first line of the block
+    :return: (text of the good records, their line numbers, malformed records as (line, text, error)),
+             or None when a quoted field may span lines and the block has to be read line by line
+    """
+    data = np.frombuffer(block, dtype=np.uint8)
+    special = np.flatnonzero((data == ord('\n')) | (data == ord(',')) | (data == ord('"')))
+    kinds = data[special]
+    ends = special[kinds == ord('\n')]
+    if not block.endswith(b'\n'):
+        ends = np.append(ends, len(block))  # the last line of the file
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    line = np.cumsum(kinds == ord('\n')) - (kinds == ord('\n'))  # the line of each byte found
+
+    comma = kinds == ord(',')
+    quote = kinds == ord('"')
+    if quote.any():
+        quotes = np.bincount(line[quote], minlength=len(ends))
+        if (quotes % 2).any():
+            return None
+        # A quote opens a field when an even number of quotes precede it on its line, and
+        # closes it otherwise; a comma is inside a quoted field when the number is odd
+        before = np.cumsum(quote) - 1 - np.concatenate(([0], np.cumsum(quotes)[:-1]))[line]
+        positions = special[quote]
+        opening = before[quote] % 2 == 0
+        previous = data[np.maximum(positions - 1, 0)]
+        following = data[np.minimum(positions + 1, len(data) - 1)]
+        # Quotes anywhere else than around a whole field ("ab"c, 5" screen) are left to the csv module
+        misplaced = np.where(opening, (positions > starts[line[quote]]) & (previous != ord(',')) & (previous != ord('"')),
+                             (positions + 1 < len(data)) & ~np.isin(following, np.frombuffer(b',"\r\n', dtype=np.uint8)))
+        if misplaced.any():
+            return None
+        comma[comma] = before[comma] % 2 == 1
+    fields = np.bincount(line[comma], minlength=len(ends)) + 1
+
+    # Lines without a comma may be blank, or hold only spaces, which are skipped as well
+    blank = np.zeros(len(ends), dtype=bool)
+    for i in np.flatnonzero(fields == 1):
+        blank[i] = not block[starts[i]:ends[i]].strip()
+    bad = (fields != width) & ~blank
+    keep = ~bad & ~blank
+    malformed = [(first + i, block[starts[i]:ends[i]].decode('utf-8').rstrip('\r'),
+                  f"Expected {width} fields, found {fields[i]}.") for i in np.flatnonzero(bad)]
+    if not keep.all():
+        block = data[np.repeat(keep, ends - starts + 1)[:len(data)]].tobytes()
+    return block, first + np.flatnonzero(keep), malformed
+
+
+def _scan_lines(lines: list, width: int, final: bool):
+    """
+    Splits lines of a CSV file into records one line at a time, for the blocks that
+    _split_block cannot split: records spanning lines and quotes that do not close.
+
+    :param lines: (line number, text) of consecutive lines
+    :param final: the lines end the file; otherwise a record still open after the last
+                  line is returned to be completed by the lines that follow
+    :return: (text of the good records, their line numbers, malformed records as (line, text, error),
+              lines of the record left open)
+    """
+    commas = width - 1
+    lines = iter(lines)
+    replay = collections.deque()
+    record, good, numbers, malformed = [], [], [], []
+    while True:
+        item = replay.popleft() if replay else next(lines, None)
+        if item is None:
+            if not record:
+                break
+            if not final:
+                return good, numbers, malformed, record
+        else:
+            number, text = item
+            if not record:
+                if '"' not in text and text.count(',') == commas:
+                    good.append(text)
+                    numbers.append(number)
+                    continue
+                if not text.strip():
+                    continue  # blank lines are skipped, as pandas does
+            record.append(item)
+            count = _field_count([text for _, text in record])
+            if count is None and len(record) < MAX_RECORD_LINES:
+                continue
+        if item is None or count is None or (len(record) > 1 and count != width):
+            # The quote opened on the first line never closes into a valid record:
+            # only that line is rejected, and the next ones are read again
+            first, *rest = record
+            malformed.append((first[0], first[1].rstrip('\r\n'), "Unterminated quote."))
+            replay.extendleft(reversed(rest))
+        else:
+            text = ''.join(text for _, text in record)
+            if count == width:
+                good.append(text)
+                numbers.append(record[0][0])
+            else:
+                error = "Malformed quotes." if count < 0 else f"Expected {width} fields, found {count}."
+                malformed.append((record[0][0], text.rstrip('\r\n'), error))
+        record = []
+    return good, numbers, malformed, []
+
+
+def _read_records(block: bytes, first: int, header: list, final: bool):
+    """
+    Parses the good records of a block with pandas, the block being split by
+    _split_block, or line by line where it cannot be.
+
+    :return: (records as strings, their line numbers, malformed records, lines of a record
+              left open at the end of the block)
+    """
+    split = _split_block(block, first, len(header))
+    if split is not None:
+        records, numbers, malformed = split
+        try:
+            chunk = _read_chunk(records, header)
+            if len(chunk) == len(numbers):
+                return chunk, numbers, malformed, b''
+        except pd.errors.ParserError:
+            pass
+    lines = [(number, text.decode('utf-8')) for number, text in enumerate(io.BytesIO(block), start=first)]
+    records, numbers, malformed, record = _scan_lines(lines, len(header), final)
+    if records and not records[-1].endswith(('\n', '\r')):
+        records[-1] += '\n'  # the last line of the file
+    chunk = _read_chunk(''.join(records).encode('utf-8'), header)
+    return chunk, np.asarray(numbers, dtype=np.int64), malformed, ''.join(text for _, text in record).encode('utf-8')
+
+
+def _read_chunk(records: bytes, header: list) -> pd.DataFrame:
+    if not records:
+        return pd.DataFrame(columns=TRANSACTION_COLUMNS, dtype=str)
+    return pd.read_csv(io.BytesIO(records), header=None, names=header, usecols=TRANSACTION_COLUMNS,
+                       dtype=str, keep_default_na=False, engine='c')[TRANSACTION_COLUMNS]
+
+
+def _error_table(rows: pd.DataFrame, failures, lines: np.ndarray) -> pd.DataFrame:
+    tables = []
+    for column, failed, message in failures:
+        positions = np.flatnonzero(failed)
+        if len(positions):
+            tables.append(pd.DataFrame({
+                'line': lines[positions],
+                'column': column,
+                'value': rows[column].iloc[positions].astype(str).to_numpy(),
+                'error': message,
+            }))
+    if not tables:
+        return pd.DataFrame(columns=ERROR_COLUMNS)
+    return pd.concat(tables, ignore_index=True).sort_values('line', kind='stable', ignore_index=True)
+
+
+@profiled
+def validate_transactions(rows: pd.DataFrame, today=None, first_line=0) -> pd.DataFrame:
+    """
+    Checks every row at once against the rules of add_transaction: a valid date that
+    is not in the future, an alphabetic category, a description that is not empty or
+    purely numeric, an amount greater than zero and a type of Expense or Income.
+
+    :param rows: transactions, either as loaded or as raw text
+    :param today: the date after which transactions are in the future (today by default)
+    :param first_line: number reported for the first row
+    :return: one row per failed rule, with columns line, column, value and error
+    """
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today)
+    _, _, failures = _check(rows, today)
+    return _error_table(rows, failures, np.arange(len(rows)) + first_line)
+
+
+@profiled
+def load_validated(file_path, chunk_size=DEFAULT_CHUNK_SIZE, today=None, report=True):
+    """
+    Loads a transactions CSV file, keeping only the rows that pass validation.
+    Every record is checked for its number of fields and its quotes before pandas
+    parses it, so a malformed line is reported with its line number instead of
+    aborting the load or being silently cut down to the expected columns. The check
+    runs on whole blocks of the file; only blocks with a quote that does not close
+    on its line are read line by line.
+
+    :param file_path: path of the CSV file
+    :param chunk_size: number of rows validated at once
+    :param today: the date after which transactions are in the future (today by default)
+    :param report: print the rows loaded and rejected, bytes read, memory used and load time
+    :return: (transactions sorted by date, error table, rejected rows as read with their errors)
+    """
+    with open(file_path, 'rb') as handle:
+        header = next(csv.reader([handle.readline().decode('utf-8-sig')]), [])
+        if not required_fields.issubset(header):
+            raise ValueError("The required fields do not match your database.")
+        today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today)
+
+        start = time.perf_counter()
+        progress = {'rows': 0, 'bytes': 0}
+        frames, errors, rejected = [], [], []
+        first, carry = 2, b''  # the header is line 1
+        for block, final in _read_blocks(handle, chunk_size):
+            block = carry + block
+            chunk, numbers, malformed, carry = _read_records(block, first, header, final)
+            first += block.count(b'\n') - carry.count(b'\n')
+            progress['rows'] += len(chunk) + len(malformed)
+            progress['bytes'] = handle.tell()
+            if malformed:
+                lines, texts, messages = (list(column) for column in zip(*malformed))
+                errors.append(pd.DataFrame({'line': lines, 'column': '', 'value': texts, 'error': messages}))
+                rejected.append(pd.DataFrame({'Line': lines, 'Error': [f"{message} Line as read: {text}"
+                                                                       for message, text in zip(messages, texts)]}))
+            if chunk.empty:
+                continue
+            dates, amounts, failures = _check(chunk, today)
+            table = _error_table(chunk, failures, numbers)
+            bad = np.zeros(len(chunk), dtype=bool)
+            for _, failed, _ in failures:
+                bad |= failed
+
+            good = chunk[~bad].copy()
+            good['Date'] = dates[~bad].astype('datetime64[ns]')
+            good['Amount'] = amounts[~bad]
+            for column in CATEGORICAL_COLUMNS:
+                good[column] = good[column].astype('category')
+            frames.append(good)
+
+            if bad.any():
+                errors.append(table)
+                messages = table.groupby('line', sort=False)['error'].agg('; '.join)
+                quarantined = chunk[bad].copy()
+                quarantined.insert(0, 'Line', numbers[bad])
+                quarantined['Error'] = quarantined['Line'].map(messages)
+                rejected.append(quarantined)
+
+    transactions = concat_transactions(frames)
+    if not transactions['Date'].is_monotonic_increasing:
+        transactions.sort_values(by='Date', kind='stable', inplace=True, ignore_index=True)
+    errors = pd.concat(errors, ignore_index=True).sort_values('line', kind='stable', ignore_index=True) \
+        if errors else pd.DataFrame(columns=ERROR_COLUMNS)
+    rejected = pd.concat(rejected, ignore_index=True).sort_values('Line', kind='stable', ignore_index=True) \
+        .reindex(columns=REJECTED_COLUMNS) if rejected else pd.DataFrame(columns=REJECTED_COLUMNS)
+
+    if report:
+        report_load(progress, transactions, time.perf_counter() - start)
+        print(f"Rows loaded: {len(transactions):,}")
+        print(f"Rows rejected: {len(rejected):,}")
+    return transactions, errors, rejected
+
+
+def quarantine_path(file_path) -> str:
+    root, _ = os.path.splitext(file_path)
+    return f"{root}{QUARANTINE_SUFFIX}"
+
+
+def quarantine(rejected: pd.DataFrame, path):
+    """
+    Writes the rejected rows, as they were in the file, with their line number and errors.
+    """
+    rejected.to_csv(path, index=False)
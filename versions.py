@@ -0,0 +1,214 @@
+import pandas as pd
+from data_loader import TRANSACTION_COLUMNS
+from date_index import restore_order, merge_sorted
+from money import for_display
+from profiling import profiled
+
+# Changes kept for undo; older ones are forgotten first
+DEFAULT_DEPTH = 100
+
+
+def _remove(transactions: pd.DataFrame, ids, row_index=None) -> pd.DataFrame:
+    # Tombstones when there is a RowIndex, like delete_transaction
+    if row_index is not None:
+        for transaction_id in ids:
+            row_index.delete(transaction_id)
+        return transactions
+    return transactions.drop(index=list(ids))
+
+
+def _insert(transactions: pd.DataFrame, rows: pd.DataFrame, row_index=None) -> pd.DataFrame:
+    # Rows still in the ledger as tombstones are simply revived; the others are merged back with their IDs
+    tombstoned = rows.index.isin(list(row_index.deleted)) if row_index is not None else None
+    if tombstoned is not None and tombstoned.any():
+        row_index.deleted.difference_update(rows.index[tombstoned])
+        rows = rows[~tombstoned]
+    return merge_sorted(transactions, rows, keep_ids=True)
+
+
+def _assign(transactions: pd.DataFrame, rows: pd.DataFrame):
+    """
+    Writes the values of `rows` over the rows with the same IDs, then moves the rows
+    whose date changed back into date order.
+    """
+    ids = rows.index
+    moved = ids[transactions.loc[ids, 'Date'].to_numpy() != pd.to_datetime(rows['Date']).to_numpy()]
+    for column in TRANSACTION_COLUMNS:
+        if isinstance(transactions[column].dtype, pd.CategoricalDtype):
+            missing = set(rows[column].unique()) - set(transactions[column].cat.categories)
+            if missing:
+                transactions[column] = transactions[column].cat.add_categories(sorted(missing))
+        transactions.loc[ids, column] = rows[column].to_numpy()
+    for transaction_id in moved:
+        restore_order(transactions, transactions.index.get_loc(transaction_id))
+
+
+def _describe(change: dict) -> str:
+    count = len(change['rows'])
+    return f"{change['op']} {count} transaction{'s' if count != 1 else ''}"
+
+
+class VersionStore:
+    """
+    Undo/redo history and named snapshots of the ledger.
+
+    Only the live DataFrame holds every row. Each version is the previous one plus
+    one recorded change, which keeps copies of the changed rows alone (the added or
+    deleted rows, or the rows before and after an edit), so a version costs memory
+    in proportion to its change and all the unchanged rows are shared. Undo and redo
+    apply a change backwards or forwards; a snapshot is just a version number.
+
+    The store listens to add, edit and delete like the AggregateCache. Undo and redo
+    notify the other listeners in turn, so the totals and the journal follow.
+    """
+
+    def __init__(self, depth=DEFAULT_DEPTH):
+        self.depth = depth
+        self.changes = []
+        self.position = 0  # changes currently applied
+        self.forgotten = 0  # changes dropped from the front because of depth
+        self.snapshots = {}  # name -> version
+        self._applying = False
+
+    @property
+    def version(self) -> int:
+        return self.forgotten + self.position
+
+    def _record(self, change: dict):
+        if self._applying:
+            return
+        # A new change after an undo replaces the changes that were undone
+        del self.changes[self.position:]
+        self.snapshots = {name: version for name, version in self.snapshots.items() if version <= self.version}
+        self.changes.append(change)
+        if len(self.changes) > self.depth:
+            del self.changes[0]
+            self.forgotten += 1
+        self.position = len(self.changes)
+
+    def on_add(self, rows: pd.DataFrame):
+        self._record({'op': 'add', 'rows': rows.copy()})
+
+    def on_delete(self, rows: pd.DataFrame):
+        self._record({'op': 'delete', 'rows': rows.copy()})
+
+    def on_edit(self, old_rows: pd.DataFrame, new_rows: pd.DataFrame):
+        self._record({'op': 'edit', 'rows': old_rows.copy(), 'new': new_rows.copy()})
+
+    def _apply(self, transactions, change, forward, listeners, row_index):
+        """
+        Applies one change (or its inverse) to the transactions and tells the listeners.
+        """
+        others = [listener for listener in listeners if listener is not self]
+        op = change['op']
+        if op == 'edit':
+            before, after = (change['rows'], change['new']) if forward else (change['new'], change['rows'])
+            _assign(transactions, after)
+            events = [('on_edit', before, after)]
+        elif (op == 'add') == forward:
+            # Redoing an add or undoing a delete: the rows come back with their IDs
+            transactions = _insert(transactions, change['rows'], row_index)
+            events = [('on_add', change['rows'])]
+        else:
+            transactions = _remove(transactions, change['rows'].index, row_index)
+            events = [('on_delete', change['rows'])]
+        for event, *rows in events:
+            for listener in others:
+                getattr(listener, event)(*rows)
+        return transactions
+
+    @profiled
+    def undo(self, transactions: pd.DataFrame, listeners=(), row_index=None) -> pd.DataFrame:
+        """
+        Reverts the last change. Costs O(changed rows), plus one merge when deleted rows come back.
+
+        :return: the transactions as they were before that change
+        """
+        if self.position == 0:
+            print("\nNothing to undo.")
+            return transactions
+        self._applying = True
+        try:
+            self.position -= 1
+            change = self.changes[self.position]
+            transactions = self._apply(transactions, change, False, listeners, row_index)
+        finally:
+            self._applying = False
+        print(f"\nUndone: {_describe(change)}.")
+        return transactions
+
+    @profiled
+    def redo(self, transactions: pd.DataFrame, listeners=(), row_index=None) -> pd.DataFrame:
+        """
+        Applies again the last change undone.
+        """
+        if self.position == len(self.changes):
+            print("\nNothing to redo.")
+            return transactions
+        self._applying = True
+        try:
+            change = self.changes[self.position]
+            transactions = self._apply(transactions, change, True, listeners, row_index)
+            self.position += 1
+        finally:
+            self._applying = False
+        print(f"\nRedone: {_describe(change)}.")
+        return transactions
+
+    def snapshot(self, name: str):
+        """
+        Names the current version. Nothing is copied.
+        """
+        self.snapshots[name] = self.version
+
+    def restore(self, name: str, transactions: pd.DataFrame, listeners=(), row_index=None) -> pd.DataFrame:
+        """
+        Goes back (or forward) to a named version by undoing or redoing the changes in between.
+        The restore itself can be undone step by step.
+        """
+        target = self.snapshots[name] - self.forgotten
+        if target < 0:
+            raise ValueError(f"Snapshot '{name}' is older than the {self.depth} changes kept.")
+        while self.position > target:
+            transactions = self.undo(transactions, listeners, row_index)
+        while self.position < target:
+            transactions = self.redo(transactions, listeners, row_index)
+        return transactions
+
+
+def manage_versions(store: VersionStore, transactions: pd.DataFrame, listeners=(), row_index=None) -> pd.DataFrame:
+    """
+    Menu option: undo, redo, and saving or restoring named snapshots.
+
+    :return: the transactions after the chosen action
+    """
+    print(f"\nChanges recorded: {len(store.changes)} ({store.position} applied, "
+          f"{len(store.changes) - store.position} undone)")
+    if store.position:
+        print(f"Last change: {_describe(store.changes[store.position - 1])}")
+        change = store.changes[store.position - 1]
+        print(for_display(change['new'] if change['op'] == 'edit' else change['rows']).head(5))
+    if store.snapshots:
+        print("Snapshots: " + ", ".join(f"{name} (version {version})" for name, version in store.snapshots.items()))
+
+    action = input("\n[U] undo, [R] redo, [S] save a snapshot, [G] go to a snapshot, [Enter] back: ").strip().capitalize()
+    if action == "U":
+        transactions = store.undo(transactions, listeners, row_index)
+    elif action == "R":
+        transactions = store.redo(transactions, listeners, row_index)
+    elif action == "S":
+        name = input("Snapshot name: ").strip()
+        if name:
+            store.snapshot(name)
+            print(f"\nSnapshot '{name}' saved (version {store.version}).")
+    elif action == "G":
+        name = input("Snapshot name: ").strip()
+        if name not in store.snapshots:
+            print("\nUnknown snapshot.")
+        else:
+            try:
+                transactions = store.restore(name, transactions, listeners, row_index)
+                print(f"\nBack to snapshot '{name}'.")
+            except ValueError as e:
+                print(f"\n{e}")
+    return transactions
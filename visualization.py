@@ -1,10 +1,37 @@
 import pandas as pd
 import matplotlib.pyplot as plt
+from profiling import profiled
+from money import to_units
 
-def monthly_spending_trend(formated: pd.DataFrame):
+
+def _expense_totals(database: pd.DataFrame, cache=None) -> pd.Series:
+    """
+    Total expense per category in currency units, taken from the cache when there is one
+    (an AggregateCache, or a SqliteStore that groups in SQL).
+    """
+    if cache is not None:
+        return to_units(cache.expense_totals())
+    expenses = database.query('Type == "Expense"')
+    return to_units(expenses.groupby('Category', observed=True)['Amount'].sum())
+
+def _finish(output=None):
+    """
+    Shows the current figure, or saves it to `output` when running without a display.
+    """
+    plt.tight_layout()
+    if output is None:
+        plt.show()
+    else:
+        plt.savefig(output)
+        plt.close()
+
+
+@profiled
+def monthly_spending_trend(formated: pd.DataFrame, output=None):
     """
     Function to plot the monthly spending trend.
     Expects a DataFrame with columns 'Date' and 'Amount' (monthly aggregates).
+    When `output` is given the chart is saved to that file instead of shown.
     """
     if formated.empty:
         print("No data available to plot.")
@@ -28,28 +55,29 @@ def monthly_spending_trend(formated: pd.DataFrame):
     plt.gca().set_facecolor('#f7f7f7')
     plt.legend(fontsize=12, loc='upper right', frameon=False)
 
-    plt.tight_layout()
-    plt.show()
+    _finish(output)
 
 
-def spending_by_categories(database: pd.DataFrame):
+@profiled
+def spending_by_categories(database: pd.DataFrame, cache=None, output=None):
     """
     Function to plot as a bar chart the spending by category, descending order
 
     :param database: The Pandas dataframe with the transactions information
+    :param cache: optional AggregateCache holding the expense totals
+    :param output: optional image file to save the chart to instead of showing it
     """
 
     if database.empty:
         print("No transactions available.")
         return
 
-    expenses = database.query('Type == "Expense"')
+    spending_by_categories = _expense_totals(database, cache)
 
-    if expenses.empty:
+    if spending_by_categories.empty:
         print("No expenses found.")
         return
 
-    spending_by_categories = expenses.groupby('Category')['Amount'].sum()
     spending_by_categories = spending_by_categories.sort_values(ascending=False)
 
     # Improved Bar Chart Visualization
@@ -70,27 +98,27 @@ def spending_by_categories(database: pd.DataFrame):
     plt.xticks(rotation=30, ha='right', fontsize=10)  # Better angle & alignment
     plt.yticks(fontsize=10)
     plt.grid(axis='y', linestyle='--', alpha=0.7)  # Light grid lines for better readability
-    plt.tight_layout()
-    plt.show()
+    _finish(output)
 
-def spending_distribution(database: pd.DataFrame):
+@profiled
+def spending_distribution(database: pd.DataFrame, cache=None, output=None):
     """
     Function to plot as a pie chart the distribution in percentage of the spending
 
     :param database: The Pandas dataframe with the transactions information
+    :param cache: optional AggregateCache holding the expense totals
+    :param output: optional image file to save the chart to instead of showing it
     """
     if database.empty:
         print("No transactions available.")
         return
 
-    expenses = database.query('Type == "Expense"')
+    spending_by_categories = _expense_totals(database, cache)
 
-    if expenses.empty:
+    if spending_by_categories.empty:
         print("No expenses found.")
         return
 
-    spending_by_categories = expenses.groupby('Category')['Amount'].sum()
-
     # Improved Pie Chart Visualization
     explode = [0.05] * len(spending_by_categories)  # Slightly separate slices
 
@@ -105,5 +133,4 @@ def spending_distribution(database: pd.DataFrame):
 
     plt.title('Spending Distribution Across Categories', fontsize=14, fontweight='bold')
     plt.ylabel('')  # Remove default label
-    plt.tight_layout()  # Optimize layout
-    plt.show()
\ No newline at end of file
+    _finish(output)  # Optimize layout and display
\ No newline at end of file